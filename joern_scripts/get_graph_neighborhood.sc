@@ -1,11 +1,36 @@
 import io.shiftleft.semanticcpg.language._
 import io.shiftleft.codepropertygraph.generated.nodes.Method
 import io.shiftleft.codepropertygraph.generated.Operators
+import scala.concurrent.{Await, Future}
+import scala.concurrent.ExecutionContext.Implicits.global
+import scala.concurrent.duration.Duration
+import scala.util.matching.Regex
 
-@main def main(cpgFile: String, methodName: String, filePath: String = "") = {
-  // Load the CPG file
-  loadCpg(cpgFile)
-  
+// Build JSON - use same escape function as extract_methods.sc
+def escapeJson(s: String): String = {
+  if (s == null) ""
+  else s.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n").replace("\r", "\\r").replace("\t", "\\t")
+}
+
+def unescapeJson(s: String): String = {
+  """\\(u[0-9a-fA-F]{4}|["\\/bfnrt])""".r.replaceAllIn(s, m => Regex.quoteReplacement(m.group(1) match {
+    case "n" => "\n"
+    case "r" => "\r"
+    case "t" => "\t"
+    case "b" => "\b"
+    case "f" => "\f"
+    case u if u.startsWith("u") => Integer.parseInt(u.drop(1), 16).toChar.toString
+    case c => c
+  }))
+}
+
+// Parse methodsJson: a JSON array of [methodName, filePath] pairs
+def parseMethodSpecs(methodsJson: String): List[(String, String)] = {
+  val specPattern = """\[\s*"((?:[^"\\]|\\.)*)"\s*,\s*"((?:[^"\\]|\\.)*)"\s*\]""".r
+  specPattern.findAllMatchIn(methodsJson).map(m => (unescapeJson(m.group(1)), unescapeJson(m.group(2)))).toList
+}
+
+def neighborhoodJson(methodName: String, filePath: String): String = {
   // Find the method(s) - use exact same pattern as extract_methods.sc
   val allMethods = cpg.method.nameExact(methodName).l
   
@@ -17,7 +42,7 @@ import io.shiftleft.codepropertygraph.generated.Operators
   }
   
   if (methodOpt.isEmpty) {
-    println(s"""{"methodName":"$methodName","filePath":"$filePath","found":false,"callers":[],"callees":[],"types":[]}""")
+    s"""{"methodName":"${escapeJson(methodName)}","filePath":"${escapeJson(filePath)}","found":false,"callers":[],"callees":[],"types":[]}"""
   } else {
     // Process using the same pattern as extract_methods.sc
     val result = List(methodOpt.get).map { m =>
@@ -55,12 +80,6 @@ import io.shiftleft.codepropertygraph.generated.Operators
     
     val (callerMethods, callees, types, methodFilePath, methodFullName) = result
     
-    // Build JSON - use same escape function as extract_methods.sc
-    def escapeJson(s: String): String = {
-      if (s == null) ""
-      else s.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n").replace("\r", "\\r").replace("\t", "\\t")
-    }
-    
     // Build JSON arrays
     val callersJson = if (callerMethods.isEmpty) "[]" else {
       "[" + callerMethods.map(c => "\"" + escapeJson(c) + "\"").mkString(",") + "]"
@@ -75,7 +94,26 @@ import io.shiftleft.codepropertygraph.generated.Operators
     }
     
     // Build final JSON
-    val json = s"""{"methodName":"${escapeJson(methodName)}","filePath":"${escapeJson(methodFilePath)}","fullName":"${escapeJson(methodFullName)}","found":true,"callers":$callersJson,"callees":$calleesJson,"types":$typesJson}"""
-    println(json)
+    s"""{"methodName":"${escapeJson(methodName)}","filePath":"${escapeJson(methodFilePath)}","fullName":"${escapeJson(methodFullName)}","found":true,"callers":$callersJson,"callees":$calleesJson,"types":$typesJson}"""
+  }
+}
+
+// Batch mode: one object per [methodName, filePath] pair, in request order.
+// Each lookup is a read-only scan of the CPG, so they run concurrently on the global pool
+def neighborhoodsJson(methodsJson: String): String = {
+  val lookups = parseMethodSpecs(methodsJson).map { case (name, path) => Future(neighborhoodJson(name, path)) }
+  val results = Await.result(Future.sequence(lookups), Duration.Inf)
+  "{\"results\":[" + results.mkString(",") + "]}"
+}
+
+@main def main(cpgFile: String, methodName: String = "", filePath: String = "", methodsJson: String = "") = {
+  // Load the CPG file
+  loadCpg(cpgFile)
+  
+  if (methodsJson.nonEmpty) {
+    // One CPG load for every requested method
+    println(neighborhoodsJson(methodsJson))
+  } else {
+    println(neighborhoodJson(methodName, filePath))
   }
 }
@@ -5,13 +5,16 @@ Supports both local directories and GitHub repositories.
 """
 
 import argparse
+import os
 import subprocess
 import sys
 import tempfile
 import shutil
 import re
 import json
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
+from typing import Any, Dict, Optional
 from urllib.parse import urlparse
 
 
@@ -172,17 +175,189 @@ def build_cpg(source_dir: str, output_path: str) -> bool:
         return False
 
 
+def _write_source_info(output: Path, info: Dict[str, Any]) -> Path:
+    """
+    Atomically write the .source_info.json file that sits next to a CPG.
+    
+    The JSON is written to a temporary file first and then moved into place,
+    so readers never see a partially written file.
+    
+    Args:
+        output: Path of the CPG file
+        info: Source directory info to save
+    
+    Returns:
+        Path of the written source info file
+    """
+    tmp = output.with_suffix('.source_info.json.tmp')
+    tmp.write_text(json.dumps(info, indent=2))
+    final = output.with_suffix('.source_info.json')
+    os.replace(tmp, final)
+    return final
+
+
+def build_from_source(
+    source: str,
+    output: str,
+    branch: Optional[str] = None,
+    clone_dir: Optional[str] = None,
+    keep_clone: bool = False
+) -> bool:
+    """
+    Build a CPG from a local directory or a GitHub repository and record its source.
+    
+    GitHub repositories are cloned first (to clone_dir, or a temporary directory
+    that is removed afterwards unless keep_clone is set). On success the source
+    directory is saved next to the CPG in .source_info.json.
+    
+    Args:
+        source: Path to source code directory or GitHub repository URL
+        output: Output path for CPG file
+        branch: Git branch or tag to checkout (GitHub repos only)
+        clone_dir: Directory to clone into; it is never cleaned up
+        keep_clone: Keep a temporary clone after building
+    
+    Returns:
+        True if successful, False otherwise
+    """
+    if not is_github_url(source):
+        # Local directory
+        success = build_cpg(source, output)
+        
+        # Save source directory info for later use
+        if success:
+            source_info_path = _write_source_info(Path(output), {
+                "source_dir": source,
+                "source_type": "local_directory"
+            })
+            print(f"✓ Saved source directory info to '{source_info_path}'")
+        return success
+    
+    print("=" * 80)
+    print("GitHub Repository Detected")
+    print("=" * 80)
+    
+    # Determine clone directory
+    if clone_dir:
+        cleanup_clone = False
+    else:
+        # Use temporary directory
+        clone_dir = tempfile.mkdtemp(prefix="graphrag_clone_")
+        cleanup_clone = not keep_clone
+    
+    try:
+        # Clone repository
+        if not clone_github_repo(source, clone_dir, branch):
+            return False
+        
+        # Build CPG from cloned directory
+        print()
+        success = build_cpg(clone_dir, output)
+        
+        # Save source directory info for later use (before cleanup)
+        if success:
+            source_info_path = _write_source_info(Path(output), {
+                "source_dir": clone_dir,
+                "source_type": "github_clone",
+                "cleanup": cleanup_clone
+            })
+            print(f"✓ Saved source directory info to '{source_info_path}'")
+            
+            if cleanup_clone:
+                print(f"\n⚠ Note: Cloned repository will be cleaned up.")
+                print(f"  To extract source code, use --keep-clone or extract methods immediately.")
+        return success
+    
+    except KeyboardInterrupt:
+        print("\n\nInterrupted by user")
+        return False
+    except Exception as e:
+        print(f"\nUnexpected error: {e}")
+        return False
+    finally:
+        # Cleanup if requested
+        if cleanup_clone and Path(clone_dir).exists():
+            print(f"\nCleaning up cloned repository at '{clone_dir}'...")
+            shutil.rmtree(clone_dir)
+            print("✓ Cleanup complete")
+
+
+def _build_one(entry: Dict[str, Any]) -> bool:
+    """
+    Build a single CPG described by a manifest entry (see build_from_source).
+    
+    Args:
+        entry: Dict with 'source', 'output' and optional 'branch' / 'keep_clone'
+    
+    Returns:
+        True if successful, False otherwise
+    """
+    # GitHub repos are always cloned to a fresh temporary directory in batch mode
+    return build_from_source(
+        entry["source"],
+        entry["output"],
+        branch=entry.get("branch"),
+        keep_clone=entry.get("keep_clone", False)
+    )
+
+
+def build_from_manifest(manifest_path: str, jobs: int, keep_clone: bool = False) -> bool:
+    """
+    Build several CPGs in parallel from a JSON manifest.
+    
+    Each build runs its own joern-parse process, so builds are dispatched
+    to a process pool and run independently.
+    
+    Args:
+        manifest_path: Path to JSON list of {"source", "output", "branch"?} entries
+        jobs: Number of builds to run concurrently
+        keep_clone: Keep cloned GitHub repositories after building
+    
+    Returns:
+        True if every build succeeded, False otherwise
+    """
+    try:
+        with open(manifest_path, 'r') as f:
+            entries = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error reading manifest '{manifest_path}': {e}")
+        return False
+    
+    if not isinstance(entries, list) or not all(
+        isinstance(e, dict) and e.get("source") and e.get("output") for e in entries
+    ):
+        print("Error: Manifest must be a JSON list of objects with 'source' and 'output'")
+        return False
+    
+    if not entries:
+        print("Manifest is empty. Nothing to build.")
+        return True
+    
+    entries = [dict(e, keep_clone=e.get("keep_clone", keep_clone)) for e in entries]
+    jobs = max(1, min(jobs, len(entries)))
+    print(f"Building {len(entries)} CPG(s) with {jobs} parallel job(s)...")
+    
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        results = list(executor.map(_build_one, entries))
+    
+    failed = [e["source"] for e, ok in zip(entries, results) if not ok]
+    print(f"\n✓ Built {len(entries) - len(failed)}/{len(entries)} CPG(s)")
+    for source in failed:
+        print(f"  ✗ Failed: {source}")
+    return not failed
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Build Code Property Graph (CPG) from source code or GitHub repository"
     )
     parser.add_argument(
         "source",
+        nargs="?",
         help="Path to source code directory or GitHub repository URL"
     )
     parser.add_argument(
         "--output", "-o",
-        required=True,
         help="Output path for CPG file (e.g., project.cpg.bin)"
     )
     parser.add_argument(
@@ -198,85 +373,33 @@ def main():
         "--clone-dir",
         help="Directory to clone GitHub repo (default: temporary directory)"
     )
+    parser.add_argument(
+        "--manifest",
+        help="JSON file listing builds as [{\"source\": ..., \"output\": ..., \"branch\": ...}] (batch mode)"
+    )
+    parser.add_argument(
+        "--jobs", "-j",
+        type=int,
+        default=max(1, (os.cpu_count() or 2) // 2),
+        help="Number of parallel builds in batch mode (default: half the CPU count)"
+    )
     
     args = parser.parse_args()
     
-    # Check if input is a GitHub URL
-    if is_github_url(args.source):
-        print("=" * 80)
-        print("GitHub Repository Detected")
-        print("=" * 80)
-        
-        # Determine clone directory
-        if args.clone_dir:
-            clone_dir = args.clone_dir
-            cleanup_clone = False
-        else:
-            # Use temporary directory
-            clone_dir = tempfile.mkdtemp(prefix="graphrag_clone_")
-            cleanup_clone = not args.keep_clone
-        
-        try:
-            # Clone repository
-            if not clone_github_repo(args.source, clone_dir, args.branch):
-                sys.exit(1)
-            
-            # Build CPG from cloned directory
-            print()
-            success = build_cpg(clone_dir, args.output)
-            
-            # Save source directory info for later use (before cleanup)
-            if success:
-                source_info_path = Path(args.output).with_suffix('.source_info.json')
-                source_info = {
-                    "source_dir": clone_dir,
-                    "source_type": "github_clone",
-                    "cleanup": cleanup_clone
-                }
-                with open(source_info_path, 'w') as f:
-                    json.dump(source_info, f, indent=2)
-                print(f"✓ Saved source directory info to '{source_info_path}'")
-                
-                if cleanup_clone:
-                    print(f"\n⚠ Note: Cloned repository will be cleaned up.")
-                    print(f"  To extract source code, use --keep-clone or extract methods immediately.")
-            
-            # Cleanup if requested
-            if cleanup_clone and Path(clone_dir).exists():
-                print(f"\nCleaning up cloned repository at '{clone_dir}'...")
-                shutil.rmtree(clone_dir)
-                print("✓ Cleanup complete")
-            
-            sys.exit(0 if success else 1)
-            
-        except KeyboardInterrupt:
-            print("\n\nInterrupted by user")
-            if cleanup_clone and Path(clone_dir).exists():
-                print(f"Cleaning up cloned repository...")
-                shutil.rmtree(clone_dir)
-            sys.exit(1)
-        except Exception as e:
-            print(f"\nUnexpected error: {e}")
-            if cleanup_clone and Path(clone_dir).exists():
-                print(f"Cleaning up cloned repository...")
-                shutil.rmtree(clone_dir)
-            sys.exit(1)
-    else:
-        # Local directory
-        success = build_cpg(args.source, args.output)
-        
-        # Save source directory info for later use
-        if success:
-            source_info_path = Path(args.output).with_suffix('.source_info.json')
-            source_info = {
-                "source_dir": args.source,
-                "source_type": "local_directory"
-            }
-            with open(source_info_path, 'w') as f:
-                json.dump(source_info, f, indent=2)
-            print(f"✓ Saved source directory info to '{source_info_path}'")
-        
-        sys.exit(0 if success else 1)
+    if args.manifest:
+        sys.exit(0 if build_from_manifest(args.manifest, args.jobs, args.keep_clone) else 1)
+    
+    if not args.source or not args.output:
+        parser.error("source and --output are required unless --manifest is given")
+    
+    success = build_from_source(
+        args.source,
+        args.output,
+        branch=args.branch,
+        clone_dir=args.clone_dir,
+        keep_clone=args.keep_clone
+    )
+    sys.exit(0 if success else 1)
 
 
 if __name__ == "__main__":
@@ -3,67 +3,118 @@
 Clean up all cloned repositories from previous CPG builds.
 """
 
-import json
+import argparse
+import os
 import shutil
 from pathlib import Path
 import sys
 
-def cleanup_all_clones():
-    """Delete all cloned repositories found in source_info.json files"""
-    cpg_dir = Path("data/cpg")
-    if not cpg_dir.exists():
-        print("No CPG directory found. Nothing to clean up.")
-        return
+from cpg_json import load_json
+
+CLONE_PREFIX = "graphrag_clone_"
+
+
+def find_clone_dirs(base_dir) -> list:
+    """Return clone directories directly under base_dir.
     
-    cleaned = []
+    Uses a single scandir pass; the entry's cached type avoids an extra
+    stat per match that glob() + is_dir() would need.
+    """
+    try:
+        with os.scandir(base_dir) as it:
+            return [
+                Path(entry.path) for entry in it
+                if entry.name.startswith(CLONE_PREFIX) and entry.is_dir(follow_symlinks=False)
+            ]
+    except OSError:
+        return []
+
+
+def discover_clones(cpg_dir: Path) -> dict:
+    """
+    Find clone directories to delete without touching them.
+    
+    Returns:
+        Mapping of resolved clone path -> description of where it was found
+    """
+    targets = {}
     
-    # Find all source_info.json files
+    def add(clone_dir, found_in):
+        # The same clone can be referenced by a source_info file and found by a sweep
+        targets.setdefault(Path(clone_dir).resolve(), found_in)
+    
+    # Find all source_info.json files (in-progress *.source_info.json.tmp writes don't match)
     for source_info_file in cpg_dir.glob("*.source_info.json"):
         try:
-            with open(source_info_file, 'r') as f:
-                source_info = json.load(f)
+            source_info = load_json(source_info_file)
             
             clone_dir = source_info.get("source_dir")
             if clone_dir and Path(clone_dir).exists():
-                print(f"Found cloned repo: {clone_dir}")
-                try:
-                    shutil.rmtree(clone_dir)
-                    cleaned.append(clone_dir)
-                    print(f"  ✓ Deleted: {clone_dir}")
-                except Exception as e:
-                    print(f"  ✗ Error deleting {clone_dir}: {e}")
+                add(clone_dir, "cloned repo")
         except Exception as e:
             print(f"Error reading {source_info_file}: {e}")
     
     # Also find any temp clone directories directly
     import tempfile
-    temp_base = Path(tempfile.gettempdir())
-    for clone_dir in temp_base.glob("graphrag_clone_*"):
-        if clone_dir.is_dir():
-            print(f"Found temp clone directory: {clone_dir}")
-            try:
-                shutil.rmtree(clone_dir)
-                cleaned.append(str(clone_dir))
-                print(f"  ✓ Deleted: {clone_dir}")
-            except Exception as e:
-                print(f"  ✗ Error deleting {clone_dir}: {e}")
+    for clone_dir in find_clone_dirs(tempfile.gettempdir()):
+        add(clone_dir, "temp clone directory")
     
     # Check current directory too
-    for clone_dir in Path(".").glob("graphrag_clone_*"):
-        if clone_dir.is_dir():
-            print(f"Found clone directory in current dir: {clone_dir}")
-            try:
-                shutil.rmtree(clone_dir)
-                cleaned.append(str(clone_dir))
-                print(f"  ✓ Deleted: {clone_dir}")
-            except Exception as e:
-                print(f"  ✗ Error deleting {clone_dir}: {e}")
+    for clone_dir in find_clone_dirs("."):
+        add(clone_dir, "clone directory in current dir")
+    
+    return targets
+
+
+def cleanup_all_clones(dry_run: bool = False):
+    """Delete all cloned repositories found in source_info.json files"""
+    cpg_dir = Path("data/cpg")
+    if not cpg_dir.exists():
+        print("No CPG directory found. Nothing to clean up.")
+        return
+    
+    # Phase 1: discovery only
+    targets = discover_clones(cpg_dir)
+    if not targets:
+        print("\nNo cloned repositories found to clean up.")
+        return
+    
+    for clone_dir, found_in in targets.items():
+        print(f"Found {found_in}: {clone_dir}")
+    
+    if dry_run:
+        print(f"\nDry run: {len(targets)} cloned repositories would be deleted")
+        return
+    
+    # Phase 2: delete
+    cleaned = []
+    for clone_dir in targets:
+        try:
+            shutil.rmtree(clone_dir)
+            cleaned.append(str(clone_dir))
+            print(f"  ✓ Deleted: {clone_dir}")
+        except Exception as e:
+            print(f"  ✗ Error deleting {clone_dir}: {e}")
     
     if cleaned:
         print(f"\n✓ Cleaned up {len(cleaned)} cloned repositories")
     else:
         print("\nNo cloned repositories found to clean up.")
 
-if __name__ == "__main__":
-    cleanup_all_clones()
 
+def main():
+    parser = argparse.ArgumentParser(
+        description="Clean up cloned repositories from previous CPG builds"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Only list clone directories that would be deleted"
+    )
+    
+    args = parser.parse_args()
+    cleanup_all_clones(dry_run=args.dry_run)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+JSON helpers shared by the scripts: whole-file load/dump (with orjson when it is
+installed), loading the CPG nodes/edges files and writing results as JSON lines
+or as CSV/Parquet tables.
+"""
+
+import csv
+import json
+from pathlib import Path
+from typing import Any
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+    _loads = orjson.loads
+    
+    def _dumps(obj):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS, default=str)
+except ImportError:
+    orjson = None
+    _loads = json.loads
+    
+    def _dumps(obj):
+        return json.dumps(obj, default=str).encode('utf-8')
+
+
+def load_json(path) -> Any:
+    """Load a JSON file, using orjson when it is installed."""
+    return _loads(Path(path).read_bytes())
+
+
+def dump_json(data: Any, path) -> None:
+    """Write a JSON file, using orjson when it is installed."""
+    if orjson is not None:
+        Path(path).write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        # Compact output; indent=2 makes the stdlib encoder much slower.
+        # json.dump writes many small chunks, so use a 1 MiB buffer.
+        with open(path, 'w', buffering=1 << 20) as f:
+            json.dump(data, f, separators=(',', ':'))
+
+
+def load_filtered_array(path, key, value):
+    """
+    Load the items of a JSON array file whose `key` field equals `value`.
+    
+    With ijson installed the file is streamed, so only the matching items are
+    held in memory; otherwise it is parsed whole (with orjson when available).
+    
+    Returns:
+        Tuple of (matching items, total item count), or None if the file is not a JSON array
+    """
+    with open(path, 'rb') as f:
+        if ijson is None:
+            items = _loads(f.read())
+            if not isinstance(items, list):
+                return None
+            return [item for item in items if item.get(key) == value], len(items)
+        
+        if f.read(4096).lstrip()[:1] != b'[':
+            return None
+        f.seek(0)
+        matching = []
+        total = 0
+        for item in ijson.items(f, 'item', use_float=True):
+            total += 1
+            if item.get(key) == value:
+                matching.append(item)
+        return matching, total
+
+
+def write_ndjson(records, path=None, out=None):
+    """
+    Write records as JSON lines, one per record, as they arrive.
+    
+    Args:
+        records: Iterable of JSON-serializable records
+        path: File to write to; when None, lines go to `out`
+        out: Binary stream used without `path` (e.g. sys.stdout.buffer), flushed after every line
+    
+    Yields:
+        Each record once it is written, so callers can keep running totals
+        without holding the records
+    """
+    f = open(path, 'wb') if path else out
+    try:
+        for record in records:
+            f.write(_dumps(record) + b'\n')
+            if not path:
+                f.flush()
+            yield record
+    finally:
+        if path:
+            f.close()
+
+
+def flat_record(fields):
+    """Copy of a dict with nested (non-scalar) values encoded as JSON strings, for table rows."""
+    return {
+        key: value if value is None or isinstance(value, (str, int, float, bool)) else json.dumps(value, default=str)
+        for key, value in fields.items()
+    }
+
+
+def _write_csv(rows, columns, path):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=columns)
+        writer.writeheader()
+        writer.writerows(rows)
+
+
+def write_table(rows, path, fmt):
+    """
+    Write flat rows to a CSV or Parquet file with pyarrow (CSV falls back to the csv module).
+    
+    Columns whose values mix scalar types (e.g. an int line in one row and a str in
+    another) are written as strings, since an Arrow column holds a single type.
+    
+    Args:
+        rows: List of dicts with scalar values
+        path: File to write
+        fmt: 'csv' or 'parquet'
+    
+    Returns:
+        True if the file was written
+    """
+    columns = list(dict.fromkeys(key for row in rows for key in row))
+    try:
+        import pyarrow as pa
+        import pyarrow.csv
+        import pyarrow.parquet
+    except ImportError:
+        if fmt == 'parquet':
+            print("Error: --format parquet requires pyarrow (pip install pyarrow)")
+            return False
+        _write_csv(rows, columns, path)
+        return True
+    
+    data = {}
+    for column in columns:
+        values = [row.get(column) for row in rows]
+        if len({type(value) for value in values if value is not None}) > 1:
+            values = [None if value is None else str(value) for value in values]
+        data[column] = values
+    
+    try:
+        table = pa.Table.from_pydict(data)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        if fmt == 'parquet':
+            print(f"Error: Could not build a Parquet table from the results: {e}")
+            return False
+        print(f"Warning: Could not build an Arrow table ({e}). Writing the CSV with the csv module.")
+        _write_csv(rows, columns, path)
+        return True
+    
+    if fmt == 'parquet':
+        pyarrow.parquet.write_table(table, path)
+    else:
+        pyarrow.csv.write_csv(table, path)
+    return True
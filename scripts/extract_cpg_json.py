@@ -10,6 +10,8 @@ import sys
 import subprocess
 from pathlib import Path
 
+from cpg_json import load_json
+
 
 def main():
     parser = argparse.ArgumentParser(
@@ -85,15 +87,11 @@ def main():
         
         # Verify files
         if nodes_file.exists():
-            import json
-            with open(nodes_file) as f:
-                nodes = json.load(f)
+            nodes = load_json(nodes_file)
             print(f"   Total nodes: {len(nodes):,}")
         
         if edges_file.exists():
-            import json
-            with open(edges_file) as f:
-                edges = json.load(f)
+            edges = load_json(edges_file)
             print(f"   Total edges: {len(edges):,}")
     else:
         print(f"\n❌ Extraction failed")
@@ -6,58 +6,128 @@ This script queries the CPG to get method information and builds text representa
 
 import argparse
 import json
+import os
+import re
 import subprocess
 import sys
+import tempfile
+import threading
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 
+from cpg_json import dump_json, load_json
+
+try:
+    from joblib import Memory
+except ImportError:
+    Memory = None
+
 # Source code extraction will be imported dynamically when needed
 
 
-def run_joern_query(cpg_path: str, scala_script: str) -> Dict[str, Any]:
+# Structural characters that matter when scanning for a JSON object
+_JSON_TOKEN_RE = re.compile(rb'[{}"\\]')
+
+
+def _read_first_json_object(stream) -> Optional[bytes]:
+    """
+    Read the first balanced {...} object from a byte stream.
+    
+    Reads line by line and only starts buffering once the object opens, so
+    parsing can start while Joern is still writing. Braces inside JSON
+    strings are ignored.
+    
+    Returns:
+        Raw JSON bytes, or None if no complete object was found
+    """
+    buf = bytearray()
+    depth = 0
+    in_string = False
+    for line in stream:
+        pos = 0
+        if depth == 0:
+            pos = line.find(b'{')
+            if pos < 0:
+                continue
+        skip_to = 0
+        for m in _JSON_TOKEN_RE.finditer(line, pos):
+            i = m.start()
+            if i < skip_to:
+                continue
+            c = line[i]
+            if in_string:
+                if c == 0x5C:  # backslash escapes the next character
+                    skip_to = i + 2
+                elif c == 0x22:
+                    in_string = False
+            elif c == 0x22:
+                in_string = True
+            elif c == 0x7B:
+                depth += 1
+            elif c == 0x7D:
+                depth -= 1
+                if depth == 0:
+                    buf += line[pos:i + 1]
+                    return bytes(buf)
+        buf += line[pos:]
+    return None
+
+
+def run_joern_query(cpg_path: str, scala_script: str, timeout: int = 300) -> Dict[str, Any]:
     """
     Run a Joern Scala script and parse JSON output.
     
     Args:
         cpg_path: Path to CPG file
         scala_script: Path to Scala script file
+        timeout: Seconds before the Joern process is killed
     
     Returns:
         Parsed JSON result or empty dict on error
     """
     try:
-        result = subprocess.run(
-            [
-                "joern",
-                "--script", scala_script,
-                "--param", f"cpgFile={cpg_path}"
-            ],
-            capture_output=True,
-            text=True,
-            check=True,
-            timeout=300
-        )
-        
-        # Try to extract JSON from output
-        output = result.stdout
-        # Look for JSON object in output
-        start_idx = output.find('{')
-        end_idx = output.rfind('}') + 1
+        with tempfile.TemporaryFile() as stderr_file:
+            proc = subprocess.Popen(
+                [
+                    "joern",
+                    "--script", scala_script,
+                    "--param", f"cpgFile={cpg_path}"
+                ],
+                stdout=subprocess.PIPE,
+                stderr=stderr_file,
+                bufsize=-1
+            )
+            timer = threading.Timer(timeout, proc.kill)
+            timer.start()
+            try:
+                with proc.stdout:
+                    json_bytes = _read_first_json_object(proc.stdout)
+                    # Drain the rest so Joern never blocks on a full pipe
+                    for _ in proc.stdout:
+                        pass
+                proc.wait()
+            finally:
+                timed_out = not timer.is_alive()
+                timer.cancel()
+            
+            if timed_out:
+                print(f"Error: Joern script timed out after {timeout} seconds")
+                return {}
+            
+            if proc.returncode != 0:
+                print(f"Error running Joern script:")
+                print(f"  Return code: {proc.returncode}")
+                stderr_file.seek(0)
+                stderr = stderr_file.read(500).decode('utf-8', errors='replace')
+                if stderr:
+                    print(f"  stderr: {stderr}")
+                return {}
         
-        if start_idx >= 0 and end_idx > start_idx:
-            json_str = output[start_idx:end_idx]
-            return json.loads(json_str)
-        else:
+        if json_bytes is None:
             print(f"Warning: No JSON found in Joern output")
-            print(f"Output: {output[:500]}")
             return {}
+        return json.loads(json_bytes)
             
-    except subprocess.CalledProcessError as e:
-        print(f"Error running Joern script:")
-        print(f"  Return code: {e.returncode}")
-        if e.stderr:
-            print(f"  stderr: {e.stderr[:500]}")
-        return {}
     except json.JSONDecodeError as e:
         print(f"Error parsing JSON from Joern output: {e}")
         return {}
@@ -66,13 +136,68 @@ def run_joern_query(cpg_path: str, scala_script: str) -> Dict[str, Any]:
         return {}
 
 
-def extract_methods(cpg_path: str, output_json: str, source_dir: Optional[str] = None, enhance_with_source: bool = True) -> bool:
+class _EmptyJoernResult(Exception):
+    """Raised inside the cached call so failed Joern runs are never memoized."""
+
+
+def _joern_query_for_cache(cpg_path: str, cpg_mtime: float, scala_script: str, script_mtime: float) -> Dict[str, Any]:
+    # The mtimes are only part of the cache key: a rebuilt CPG or edited script misses
+    result = run_joern_query(cpg_path, scala_script)
+    if not result:
+        raise _EmptyJoernResult()
+    return result
+
+
+if Memory is not None:
+    _cached_joern_query = Memory(
+        str(Path(__file__).parent.parent / ".joern_cache"), verbose=0
+    ).cache(_joern_query_for_cache)
+else:
+    _cached_joern_query = None
+
+
+def run_joern_query_cached(cpg_path: str, scala_script: str, use_cache: bool = True) -> Dict[str, Any]:
+    """
+    Run a Joern Scala script, reusing the on-disk result for an unchanged CPG and script.
+    
+    Falls back to run_joern_query when joblib is not installed or use_cache is False.
+    
+    Args:
+        cpg_path: Path to CPG file
+        scala_script: Path to Scala script file
+        use_cache: Whether to read and write the on-disk cache
+    
+    Returns:
+        Parsed JSON result or empty dict on error
+    """
+    if not use_cache or _cached_joern_query is None:
+        return run_joern_query(cpg_path, scala_script)
+    
+    cpg_path = os.path.abspath(cpg_path)
+    scala_script = os.path.abspath(scala_script)
+    try:
+        return _cached_joern_query(
+            cpg_path, os.path.getmtime(cpg_path),
+            scala_script, os.path.getmtime(scala_script)
+        )
+    except _EmptyJoernResult:
+        return {}
+
+
+def extract_methods(
+    cpg_path: str,
+    output_json: str,
+    source_dir: Optional[str] = None,
+    enhance_with_source: bool = True,
+    use_cache: bool = True
+) -> bool:
     """
     Extract all methods from CPG and save to JSON.
     
     Args:
         cpg_path: Path to CPG file
         output_json: Path to output JSON file
+        use_cache: Reuse cached Joern output when the CPG and script are unchanged
     
     Returns:
         True if successful
@@ -95,21 +220,12 @@ def extract_methods(cpg_path: str, output_json: str, source_dir: Optional[str] =
         return False
     
     print(f"Extracting methods from CPG '{cpg_path}'...")
-    result = run_joern_query(cpg_path, str(extract_script))
+    result = run_joern_query_cached(cpg_path, str(extract_script), use_cache=use_cache)
     
     if "methods" in result:
         methods = result["methods"]
         print(f"✓ Extracted {len(methods)} methods")
         
-        # Save to JSON
-        output_path = Path(output_json)
-        output_path.parent.mkdir(parents=True, exist_ok=True)
-        
-        with open(output_path, 'w') as f:
-            json.dump(result, f, indent=2)
-        
-        print(f"✓ Saved to '{output_json}'")
-        
         # Enhance with source code if source directory is available
         if enhance_with_source and source_dir:
             print(f"\nEnhancing with source code from '{source_dir}'...")
@@ -120,21 +236,26 @@ def extract_methods(cpg_path: str, output_json: str, source_dir: Optional[str] =
                 if extract_source_path.exists():
                     spec = importlib.util.spec_from_file_location("extract_source_code", extract_source_path)
                     extract_module = importlib.util.module_from_spec(spec)
+                    # Register the module so its worker functions can be pickled for subprocesses
+                    sys.modules["extract_source_code"] = extract_module
                     spec.loader.exec_module(extract_module)
                     
-                    enhanced_output = str(output_path).replace('.json', '_enhanced.json')
-                    if extract_module.enhance_methods_with_source_code(str(output_path), enhanced_output, source_dir):
-                        print(f"✓ Enhanced methods saved to '{enhanced_output}'")
-                        # Replace original with enhanced
-                        import shutil
-                        shutil.move(enhanced_output, output_path)
-                        print(f"✓ Replaced original with enhanced version")
+                    # Enhance in memory so the JSON is written only once
+                    result = extract_module.enhance_methods_dict(result, source_dir)
                 else:
                     print(f"Warning: extract_source_code.py not found, skipping enhancement")
             except Exception as e:
                 print(f"Warning: Could not enhance with source code: {e}")
                 print("  Continuing with AST code representation")
         
+        # Save to JSON
+        output_path = Path(output_json)
+        output_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        dump_json(result, output_path)
+        
+        print(f"✓ Saved to '{output_json}'")
+        
         return True
     else:
         print("Error: No methods found in Joern output")
@@ -199,6 +320,11 @@ def main():
         action="store_true",
         help="Skip enhancing with source code even if source directory is available"
     )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Re-run Joern even if a cached result exists for this CPG"
+    )
     
     args = parser.parse_args()
     
@@ -208,8 +334,7 @@ def main():
         source_info_path = Path(args.cpg_path).with_suffix('.source_info.json')
         if source_info_path.exists():
             try:
-                with open(source_info_path, 'r') as f:
-                    source_info = json.load(f)
+                source_info = load_json(source_info_path)
                 source_dir = source_info.get("source_dir")
                 if source_dir and Path(source_dir).exists():
                     print(f"✓ Auto-detected source directory: {source_dir}")
@@ -220,7 +345,8 @@ def main():
         args.cpg_path, 
         args.output, 
         source_dir=source_dir,
-        enhance_with_source=not args.no_enhance
+        enhance_with_source=not args.no_enhance,
+        use_cache=not args.no_cache
     )
     sys.exit(0 if success else 1)
 
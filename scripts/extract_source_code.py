@@ -4,10 +4,124 @@ Helper script to extract actual source code from methods.json
 by reading from source files using filePath and lineNumber.
 """
 
-import json
+import bisect
+import functools
+import mmap
+import os
+import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional, Tuple
+
+import numpy as np
+
+from cpg_json import dump_json, load_json
+
+# A def/class line; group 1 is its indentation (any whitespace except newlines)
+_HEADER_RE = re.compile(rb'^([^\S\n]*)(?:def|class) ', re.MULTILINE)
+
+
+def _resolve_source_file(file_path: str, source_base_dir: Optional[str] = None) -> Optional[Path]:
+    """Locate a method's source file, or None if it cannot be found."""
+    source_file = Path(file_path)
+    
+    # If not absolute and base dir provided, try relative to base
+    if not source_file.is_absolute() and source_base_dir:
+        source_file = Path(source_base_dir) / source_file
+    
+    # If still doesn't exist, try just the filename
+    if not source_file.exists():
+        source_file = Path(source_file.name)
+    
+    if not source_file.exists():
+        return None
+    return source_file
+
+
+@functools.lru_cache(maxsize=64)
+def _file_index(path: str, mtime: float) -> tuple:
+    """
+    Map a source file and index its lines and def/class lines.
+    
+    The file is memory-mapped rather than split into Python strings; only
+    the newline offsets are materialized (as a numpy array), and only the
+    extracted method bodies are ever decoded. Cached per (path, mtime) so
+    a changed file is re-read.
+    
+    Returns:
+        (data, line_starts, header_lines, header_indents) where line_starts
+        holds the byte offset of each line and header_lines the sorted
+        0-based indices of lines starting with 'def ' or 'class '
+    """
+    with open(path, 'rb', buffering=0) as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            data = b''
+    
+    newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == 0x0A)
+    line_starts = np.concatenate(([0], newlines + 1))
+    if len(line_starts) > 1 and line_starts[-1] == len(data):
+        # A trailing newline does not start another line
+        line_starts = line_starts[:-1]
+    if not len(data):
+        line_starts = line_starts[:0]
+    
+    header_offsets = []
+    header_indents = []
+    for m in _HEADER_RE.finditer(data):
+        header_offsets.append(m.start())
+        header_indents.append(len(m.group(1)))
+    header_lines = np.searchsorted(line_starts, header_offsets, side='right') - 1
+    return data, line_starts.tolist(), header_lines.tolist(), header_indents
+
+
+def _extract_from_index(index: tuple, line_number: int) -> Optional[str]:
+    """
+    Extract the method starting at line_number using a file index.
+    
+    The method ends at the next def/class at the same or lower indentation,
+    which is looked up in the index instead of re-scanning every line.
+    """
+    data, line_starts, header_lines, header_indents = index
+    n_lines = len(line_starts)
+    
+    if line_number < 1 or line_number > n_lines:
+        return None
+    
+    def line_end(i):
+        return line_starts[i + 1] if i + 1 < n_lines else len(data)
+    
+    # Start from the method line, skipping empty lines at start
+    start_idx = line_number - 1
+    first = start_idx
+    while first < n_lines and not data[line_starts[first]:line_end(first)].strip():
+        first += 1
+    if first == n_lines:
+        return None
+    
+    # Determine base indentation from first non-empty line
+    line = data[line_starts[first]:line_end(first)]
+    base_indent = len(line) - len(line.lstrip())
+    
+    # Stop at the next def/class at same or less indentation (never the start line itself)
+    end = n_lines
+    h = bisect.bisect_left(header_lines, first + 1 if first == start_idx else first)
+    while h < len(header_lines):
+        if header_indents[h] <= base_indent:
+            end = header_lines[h]
+            break
+        h += 1
+    if end == first:
+        return None
+    
+    body = data[line_starts[first]:line_starts[end] if end < n_lines else len(data)]
+    method_lines = body.decode('utf-8', errors='ignore').split('\n')
+    if body.endswith(b'\n'):
+        method_lines.pop()
+    return '\n'.join(l.rstrip() for l in method_lines)
 
 
 def extract_method_source_code(
@@ -19,6 +133,9 @@ def extract_method_source_code(
     """
     Extract method source code from file.
     
+    Files are read and indexed once per (path, mtime), so extracting many
+    methods from the same file only reads it once.
+    
     Args:
         file_path: Path to source file (may be relative)
         line_number: Line number where method starts
@@ -28,69 +145,136 @@ def extract_method_source_code(
     Returns:
         Method source code or None if not found
     """
-    # Try to find the source file
-    source_file = Path(file_path)
-    
-    # If not absolute and base dir provided, try relative to base
-    if not source_file.is_absolute() and source_base_dir:
-        source_file = Path(source_base_dir) / source_file
-    
-    # If still doesn't exist, try just the filename
-    if not source_file.exists():
-        source_file = Path(source_file.name)
-    
-    if not source_file.exists():
+    source_file = _resolve_source_file(file_path, source_base_dir)
+    if source_file is None:
         return None
     
     try:
-        with open(source_file, 'r', encoding='utf-8', errors='ignore') as f:
-            lines = f.readlines()
-        
-        if line_number < 1 or line_number > len(lines):
-            return None
-        
-        # Start from the method line
-        start_idx = line_number - 1
-        
-        # For Python, find the method definition and extract until next def/class at same or lower indentation
-        method_lines = []
-        base_indent = None
-        
-        for i in range(start_idx, len(lines)):
-            line = lines[i]
-            
-            # Skip empty lines at start
-            if not method_lines and not line.strip():
-                continue
-            
-            # Determine base indentation from first non-empty line
-            if base_indent is None and line.strip():
-                base_indent = len(line) - len(line.lstrip())
-            
-            # If we hit a line at same or less indentation that's a def/class (and not our method)
-            if base_indent is not None:
-                current_indent = len(line) - len(line.lstrip())
-                stripped = line.strip()
-                
-                # Stop if we hit another def/class at same or less indentation
-                if (stripped.startswith('def ') or stripped.startswith('class ')) and \
-                   current_indent <= base_indent and \
-                   i > start_idx:
-                    break
-            
-            method_lines.append(line.rstrip())
-        
-        return '\n'.join(method_lines) if method_lines else None
-        
+        path = str(source_file.resolve())
+        return _extract_from_index(_file_index(path, os.stat(path).st_mtime), line_number)
     except Exception as e:
         print(f"Warning: Could not read {source_file}: {e}", file=sys.stderr)
         return None
 
 
+# Files are handed to worker processes in batches of roughly this many methods
+_BATCH_METHODS = 256
+
+
+def _extract_file_methods(path: str, entries: List[Tuple[int, int]]) -> List[Tuple[int, Optional[str]]]:
+    """Extract several methods from one file, given (idx, line_number) entries."""
+    try:
+        index = _file_index(path, os.stat(path).st_mtime)
+    except Exception as e:
+        print(f"Warning: Could not read {path}: {e}", file=sys.stderr)
+        return [(idx, None) for idx, _ in entries]
+    return [
+        (idx, _extract_from_index(index, line_number))
+        for idx, line_number in sorted(entries, key=lambda entry: entry[1])
+    ]
+
+
+def _extract_file_batch(batch: List[Tuple[str, List[Tuple[int, int]]]]) -> List[Tuple[int, Optional[str]]]:
+    """Worker entry point: extract methods for a batch of files."""
+    results = []
+    for path, entries in batch:
+        results.extend(_extract_file_methods(path, entries))
+    return results
+
+
+def _extract_all(
+    tasks: List[Tuple[str, List[Tuple[int, int]]]],
+    max_workers: Optional[int] = None
+) -> List[Tuple[int, Optional[str]]]:
+    """
+    Extract methods for all (path, entries) tasks, in parallel across files.
+    
+    Small files are batched together so each worker call does enough work to
+    amortize the inter-process overhead.
+    """
+    batches = []
+    current = []
+    current_size = 0
+    for task in tasks:
+        current.append(task)
+        current_size += len(task[1])
+        if current_size >= _BATCH_METHODS:
+            batches.append(current)
+            current = []
+            current_size = 0
+    if current:
+        batches.append(current)
+    
+    workers = min(max_workers or os.cpu_count() or 1, len(batches))
+    if workers > 1:
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                return [
+                    result
+                    for results in executor.map(_extract_file_batch, batches)
+                    for result in results
+                ]
+        except Exception as e:
+            print(f"Warning: Parallel extraction failed ({e}), falling back to serial", file=sys.stderr)
+    
+    return [result for batch in batches for result in _extract_file_batch(batch)]
+
+
+def enhance_methods_dict(
+    data: Dict[str, Any],
+    source_base_dir: Optional[str] = None,
+    max_workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Enhance an in-memory methods dict with actual source code.
+    
+    Args:
+        data: Parsed methods.json content (modified in place)
+        source_base_dir: Base directory for source files
+        max_workers: Worker processes for extraction (default: CPU count, 1 = serial)
+    
+    Returns:
+        The same dict, with code replaced where the source file was found
+    """
+    methods = data.get("methods", [])
+    enhanced_count = 0
+    
+    # Group methods by source file so each file is read and indexed once
+    by_file = {}
+    for idx, method in enumerate(methods):
+        file_path = method.get("filePath", "")
+        line_number = method.get("lineNumber", 0)
+        if file_path and line_number > 0:
+            by_file.setdefault(file_path, []).append((idx, line_number))
+    
+    tasks = []
+    for file_path, entries in by_file.items():
+        source_file = _resolve_source_file(file_path, source_base_dir)
+        if source_file is None:
+            for idx, _ in entries:
+                methods[idx]["codeSource"] = "ast"  # Keep AST code
+        else:
+            tasks.append((str(source_file.resolve()), entries))
+    
+    for idx, source_code in _extract_all(tasks, max_workers):
+        method = methods[idx]
+        if source_code:
+            # Replace AST code with actual source code
+            method["code"] = source_code
+            method["codeSource"] = "source_file"  # Mark as from source
+            enhanced_count += 1
+        else:
+            method["codeSource"] = "ast"  # Keep AST code
+    
+    print(f"✓ Enhanced {enhanced_count}/{len(methods)} methods with source code")
+    return data
+
+
 def enhance_methods_with_source_code(
     methods_json_path: str,
     output_json_path: str,
-    source_base_dir: Optional[str] = None
+    source_base_dir: Optional[str] = None,
+    max_workers: Optional[int] = None
 ) -> bool:
     """
     Enhance methods.json with actual source code.
@@ -99,39 +283,15 @@ def enhance_methods_with_source_code(
         methods_json_path: Path to input methods.json
         output_json_path: Path to output enhanced methods.json
         source_base_dir: Base directory for source files
+        max_workers: Worker processes for extraction (default: CPU count, 1 = serial)
     """
-    with open(methods_json_path, 'r') as f:
-        data = json.load(f)
-    
-    methods = data.get("methods", [])
-    enhanced_count = 0
-    
-    for method in methods:
-        file_path = method.get("filePath", "")
-        line_number = method.get("lineNumber", 0)
-        method_name = method.get("methodName", "")
-        
-        if file_path and line_number > 0:
-            source_code = extract_method_source_code(
-                file_path, line_number, method_name, source_base_dir
-            )
-            
-            if source_code:
-                # Replace AST code with actual source code
-                method["code"] = source_code
-                method["codeSource"] = "source_file"  # Mark as from source
-                enhanced_count += 1
-            else:
-                method["codeSource"] = "ast"  # Keep AST code
+    data = enhance_methods_dict(load_json(methods_json_path), source_base_dir, max_workers)
     
     # Save enhanced methods
     output_path = Path(output_json_path)
     output_path.parent.mkdir(parents=True, exist_ok=True)
     
-    with open(output_path, 'w') as f:
-        json.dump(data, f, indent=2)
-    
-    print(f"✓ Enhanced {enhanced_count}/{len(methods)} methods with source code")
+    dump_json(data, output_path)
     return True
 
 
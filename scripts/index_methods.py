@@ -4,17 +4,78 @@ Embed method representations and index them in ChromaDB.
 """
 
 import argparse
+import functools
+import hashlib
+import importlib.util
 import json
+import os
+import re
+import sqlite3
 import sys
 import warnings
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import filterfalse
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 
 import chromadb
 from chromadb.config import Settings
+import numpy as np
 from sentence_transformers import SentenceTransformer
+import torch
+from tqdm import tqdm
 import yaml
 
+from cpg_json import load_json
+
+# Path keywords that mark training/evaluation code; such files get their path put first
+IMPORTANT_RE = re.compile(r'train|eval|test|validation|infer|predict')
+# Joern models operators (+, [], =, ...) as calls named "<operator>.xxx"
+OPERATOR_CALLEE_RE = re.compile(r'<operator')
+# Method names that never answer a question: Joern operators/meta methods and
+# tiny dunder/accessor helpers (see is_real_method)
+BAD_METHOD_NAMES = frozenset({"item", "keys", "t", "__iter__", "__next__"})
+BAD_METHOD_PREFIX_RE = re.compile(r'<(?:operator|init|meta|fake)')
+# <module> entries from these files are kept, they often hold the main logic
+MODULE_KEEP_RE = re.compile(r'train|eval|test|validation|infer|predict|main')
+
+# Exported encoders live under models/<onnx|openvino>/, one subdirectory per model
+MODELS_DIR = Path(__file__).parent.parent / "models"
+BACKENDS = ("torch", "onnx", "onnx-int8", "openvino")
+# Model file each exported backend loads, relative to the model's export directory
+EXPORTED_MODEL_FILES = {
+    "onnx": "onnx/model_O3.onnx",
+    "onnx-int8": "onnx/model_qint8_avx512_vnni.onnx",
+    "openvino": "openvino/openvino_model.xml",
+}
+# Packages each exported backend needs on top of sentence-transformers
+BACKEND_MODULES = {
+    "onnx": ("optimum", "onnxruntime"),
+    "onnx-int8": ("optimum", "onnxruntime"),
+    "openvino": ("optimum", "openvino"),
+}
+DEVICES = ("auto", "cuda", "mps", "cpu")
+PRECISIONS = ("auto", "fp32", "fp16", "bf16")
+# Encode batch sizes that keep each device busy without running out of memory
+DEFAULT_BATCH_SIZES = {"cuda": 128, "mps": 64, "cpu": 32}
+# HNSW settings for new collections; Chroma fixes them at creation, so an
+# existing collection keeps its own until it is rebuilt with --rebuild
+HNSW_METADATA = {
+    "hnsw:space": "ip",  # Vectors are stored unit-length, so this is cosine distance
+    "hnsw:construction_ef": 200,
+    "hnsw:M": 32,
+    "hnsw:search_ef": 128,
+}
+# Method texts are built in worker processes in chunks of this size, but only
+# for projects big enough to pay for pickling the method dicts across
+REPRESENTATION_CHUNK_SIZE = 5000
+PARALLEL_MIN_METHODS = 20000
+# Unique texts encoded per chunk before the chunk is handed to ChromaDB
+ENCODE_CHUNK_SIZE = 2048
+# ChromaDB has a maximum batch size (around 5461), and smaller batches keep
+# the per-batch Python lists small and let Chroma commit incrementally
+UPSERT_BATCH_SIZE = 1000
+
 
 def load_config() -> Dict[str, Any]:
     """Load configuration from config.yaml"""
@@ -25,11 +86,472 @@ def load_config() -> Dict[str, Any]:
     return {}
 
 
+def configure_torch_threads(threads: Optional[int] = None) -> None:
+    """
+    Set torch's CPU thread pools for encoding.
+    
+    Args:
+        threads: Intra-op threads (default: OMP_NUM_THREADS or the CPU count, capped at 8,
+            since BERT-base stops scaling around there and more threads just contend)
+    """
+    if threads is None:
+        threads = min(int(os.environ.get("OMP_NUM_THREADS", os.cpu_count() or 4)), 8)
+    torch.set_num_threads(threads)
+    try:
+        # One batch runs at a time, so inter-op parallelism only adds contention
+        torch.set_num_interop_threads(1)
+    except RuntimeError:
+        # Can only be set before torch starts any parallel work
+        pass
+
+
+def _detect_device() -> str:
+    """Pick the fastest available torch device: CUDA, then Apple MPS, then CPU."""
+    try:
+        if torch.cuda.is_available():
+            return "cuda"
+        if torch.backends.mps.is_available():
+            return "mps"
+    except Exception:
+        pass
+    return "cpu"
+
+
+def resolve_backend(backend: str) -> str:
+    """Return the backend if its packages are installed, otherwise fall back to "torch"."""
+    missing = [m for m in BACKEND_MODULES.get(backend, ()) if importlib.util.find_spec(m) is None]
+    if missing:
+        print(f"Warning: Backend '{backend}' needs {', '.join(missing)}, falling back to torch")
+        return "torch"
+    return backend
+
+
+def _load_exported_model(embedding_model_name: str, backend: str) -> SentenceTransformer:
+    """
+    Load an ONNX Runtime or OpenVINO export of the model for CPU inference.
+    
+    The export (plus graph optimization or int8 quantization for the ONNX
+    backends) runs once; later runs load the saved file.
+    """
+    import sentence_transformers
+    
+    st_backend = "openvino" if backend == "openvino" else "onnx"
+    local_dir = MODELS_DIR / st_backend / embedding_model_name.replace("/", "__")
+    file_name = EXPORTED_MODEL_FILES[backend]
+    if not (local_dir / file_name).exists():
+        print(f"Exporting '{embedding_model_name}' for {backend} (one-time)...")
+        model = SentenceTransformer(embedding_model_name, backend=st_backend, device="cpu")
+        model.save(str(local_dir))
+        if backend == "onnx":
+            sentence_transformers.export_optimized_onnx_model(model, "O3", str(local_dir))
+        elif backend == "onnx-int8":
+            sentence_transformers.export_dynamic_quantized_onnx_model(model, "avx512_vnni", str(local_dir))
+        print(f"✓ Saved exported model to '{local_dir}'")
+    
+    model_kwargs = {"file_name": file_name}
+    if st_backend == "onnx":
+        model_kwargs["provider"] = "CPUExecutionProvider"
+    return SentenceTransformer(
+        str(local_dir),
+        backend=st_backend,
+        device="cpu",
+        model_kwargs=model_kwargs
+    )
+
+
+def load_embedding_model(
+    embedding_model_name: str,
+    backend: str = "torch",
+    device: str = "auto",
+    precision: str = "auto"
+) -> SentenceTransformer:
+    """
+    Load the embedding model.
+    
+    Args:
+        embedding_model_name: Name of embedding model
+        backend: "torch", or an exported CPU backend (see BACKENDS)
+        device: Torch device, or "auto" to detect CUDA/MPS/CPU
+        precision: Torch weight precision, or "auto" for fp16 on GPUs and fp32 on CPU
+    """
+    print(f"Loading embedding model '{embedding_model_name}' ({backend})...")
+    print("Note: Warnings about model weights initialization are expected and can be ignored.")
+    # Suppress warnings about model weights initialization when using non-sentence-transformers models
+    # These warnings are expected when using HuggingFace models with sentence-transformers
+    import logging
+    
+    # Suppress transformers warnings
+    os.environ["TRANSFORMERS_VERBOSITY"] = "error"
+    logging.getLogger("transformers").setLevel(logging.ERROR)
+    logging.getLogger("sentence_transformers").setLevel(logging.ERROR)
+    
+    with warnings.catch_warnings():
+        warnings.filterwarnings("ignore", category=UserWarning)
+        warnings.filterwarnings("ignore", message=".*Some weights of.*were not initialized.*")
+        warnings.filterwarnings("ignore", message=".*Creating a new one with mean pooling.*")
+        warnings.filterwarnings("ignore", message=".*No sentence-transformers model found.*")
+        if backend != "torch":
+            device = "cpu"
+            precision = "int8" if backend == "onnx-int8" else "fp32"
+            model = _load_exported_model(embedding_model_name, backend)
+        else:
+            if device == "auto":
+                device = _detect_device()
+            model = SentenceTransformer(embedding_model_name, device=device)
+            if precision == "auto":
+                # FP16 halves memory traffic and lets tensor cores run the matmuls
+                precision = "fp16" if device in ("cuda", "mps") else "fp32"
+            if precision != "fp32":
+                try:
+                    model = model.to(torch.float16 if precision == "fp16" else torch.bfloat16)
+                except Exception as e:
+                    print(f"Warning: Could not cast model to {precision}, using fp32: {e}")
+                    precision = "fp32"
+    print(f"✓ Model loaded successfully (device: {device}, precision: {precision})")
+    return model
+
+
+def encoder_key(embedding_model_name: str, backend: str = "torch", emb_dim: Optional[int] = None) -> str:
+    """
+    Identify the encoder and vector post-processing in text hashes, so switching
+    backend or dimension re-embeds everything. "#unit" marks normalized vectors.
+    """
+    key = embedding_model_name if backend == "torch" else f"{embedding_model_name}@{backend}"
+    if emb_dim:
+        key = f"{key}:{emb_dim}"
+    return f"{key}#unit"
+
+
+def postprocess_embeddings(embeddings: np.ndarray, emb_dim: Optional[int]) -> np.ndarray:
+    """
+    Optionally keep only the first emb_dim dimensions, then scale rows to unit length.
+    
+    Unit vectors let the collection use inner-product distance, which equals
+    cosine distance here without Chroma normalizing every vector itself.
+    """
+    if emb_dim and emb_dim < embeddings.shape[1]:
+        embeddings = embeddings[:, :emb_dim]
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    np.maximum(norms, 1e-12, out=norms)
+    return embeddings / norms
+
+
+def text_hash(embedding_model_name: str, text: str) -> str:
+    """Stable hash of a method text; an embedding is reusable while this is unchanged."""
+    return hashlib.blake2b(
+        f"{embedding_model_name}\0{text}".encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+
+def encode_texts(
+    model: SentenceTransformer,
+    texts: List[str],
+    batch_size: int,
+    show_progress_bar: bool = True
+) -> np.ndarray:
+    """
+    Encode texts to float32 embeddings, halving the batch size on CUDA out-of-memory.
+    
+    Args:
+        model: Loaded embedding model
+        texts: Texts to encode
+        batch_size: Initial encode batch size
+        show_progress_bar: Show sentence-transformers' per-batch progress bar
+    
+    Returns:
+        Array of shape (len(texts), dim)
+    """
+    while True:
+        try:
+            return model.encode(
+                texts,
+                show_progress_bar=show_progress_bar,
+                batch_size=batch_size,
+                convert_to_numpy=True
+            ).astype(np.float32, copy=False)  # fp16 models on CUDA return float16
+        except torch.cuda.OutOfMemoryError:
+            if batch_size == 1:
+                raise
+            torch.cuda.empty_cache()
+            batch_size //= 2
+            print(f"  Out of GPU memory, retrying with batch size {batch_size}")
+
+
+def open_embedding_cache(path) -> sqlite3.Connection:
+    """Open (creating if needed) the SQLite embedding cache keyed by text_hash."""
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path))
+    conn.execute("CREATE TABLE IF NOT EXISTS embeddings (hash TEXT PRIMARY KEY, vec BLOB NOT NULL)")
+    return conn
+
+
+def lookup_cached_embeddings(conn: sqlite3.Connection, hashes: List[str]) -> Dict[str, np.ndarray]:
+    """Return the cached float32 vector for each hash that is in the cache."""
+    found = {}
+    # Stay well below SQLite's bound-parameter limit
+    for start in range(0, len(hashes), 500):
+        batch = hashes[start:start + 500]
+        placeholders = ",".join("?" * len(batch))
+        for h, blob in conn.execute(
+            f"SELECT hash, vec FROM embeddings WHERE hash IN ({placeholders})", batch
+        ):
+            found[h] = np.frombuffer(blob, dtype=np.float32)
+    return found
+
+
+def store_cached_embeddings(conn: sqlite3.Connection, hashes: List[str], vectors: np.ndarray) -> None:
+    """Write vectors (row k belongs to hashes[k]) to the cache."""
+    conn.executemany(
+        "INSERT OR REPLACE INTO embeddings (hash, vec) VALUES (?, ?)",
+        zip(hashes, (v.tobytes() for v in vectors))
+    )
+    conn.commit()
+
+
+def _expand_to_methods(units: List[int], methods_by_text: List[List[int]]) -> Tuple[List[int], List[int]]:
+    """Map unique texts to (method indices, row of each method's vector among units)."""
+    indices = []
+    rows = []
+    for row, u in enumerate(units):
+        indices.extend(methods_by_text[u])
+        rows.extend([row] * len(methods_by_text[u]))
+    return indices, rows
+
+
+def _gather_rows(vectors: np.ndarray, rows: List[int]) -> np.ndarray:
+    """Select per-method rows; without duplicate texts rows is 0..n-1 and no copy is made."""
+    return vectors if len(rows) == len(vectors) else vectors[rows]
+
+
+def _upsert_methods(
+    collection,
+    indices: List[int],
+    vectors: np.ndarray,
+    ids: List[str],
+    documents: List[str],
+    metadatas: List[Dict[str, Any]]
+) -> None:
+    """Upsert the methods at indices (vectors[k] belongs to indices[k]) in ChromaDB-sized batches."""
+    for start in range(0, len(indices), UPSERT_BATCH_SIZE):
+        batch = indices[start:start + UPSERT_BATCH_SIZE]
+        collection.upsert(
+            ids=[ids[i] for i in batch],
+            # Chroma takes numpy arrays directly; slicing is a view, no Python floats
+            embeddings=vectors[start:start + UPSERT_BATCH_SIZE],
+            documents=[documents[i] for i in batch],
+            metadatas=[metadatas[i] for i in batch]
+        )
+
+
+@functools.lru_cache(maxsize=8192)
+def _path_fragments(file_path: str) -> Tuple[bool, bool, str, str]:
+    """
+    Path-derived parts of a method text, computed once per file.
+    
+    Returns:
+        (has_important_keyword, is_training_file, file_head, file_tail)
+    """
+    # File path FIRST if it contains important keywords (train, eval, test, etc.)
+    # This helps with queries like "where is training" or "where is evaluation"
+    file_path_lower = file_path.lower()
+    has_important_keyword = IMPORTANT_RE.search(file_path_lower) is not None
+    is_training_file = has_important_keyword and "train" in file_path_lower
+    
+    file_head = ""
+    file_tail = ""
+    if file_path:
+        # Only the last two components are used, so don't split the whole path
+        path_parts = file_path.replace("\\", "/").rsplit("/", 2)
+        short_path = '/'.join(path_parts[-2:])
+        if has_important_keyword:
+            # Put file path first for training/eval files (ALWAYS, even for <module>),
+            # plus just the filename for emphasis
+            file_head = f"File: {short_path}" if len(path_parts) > 1 else f"File: {file_path}"
+            file_head += f"\n{path_parts[-1]}"
+            # For training files, add explicit keywords
+            if is_training_file:
+                file_head += "\ntraining\ntrain"
+        else:
+            # Directory names can be semantic, so include them at the end
+            file_tail = f"In: {short_path}" if len(path_parts) > 1 else f"File: {file_path}"
+    
+    return has_important_keyword, is_training_file, file_head, file_tail
+
+
+def build_method_text(method: Dict[str, Any]) -> str:
+    """
+    Build the text representation of a method that gets embedded.
+    
+    Structure: most important info first, then context. This helps
+    embeddings capture the essence of the method. Each section is built as
+    one fragment ("" when absent) and empty fragments are dropped at the end.
+    """
+    get = method.get
+    file_path = get("filePath", "")
+    method_name = get("methodName", "")
+    
+    has_important_keyword, is_training_file, file_head, file_tail = _path_fragments(file_path)
+    
+    # Method name (most important for semantic matching), repeated for emphasis
+    name_block = ""
+    if method_name and method_name != "<module>":
+        name_block = f"Method: {method_name}\n{method_name}"
+        # For "main" methods, add context that it's an entry point
+        if method_name == "main" and has_important_keyword:
+            name_block += "\nentry point main function"
+    elif method_name == "<module>" and has_important_keyword and is_training_file:
+        # For <module> entries in training files, add context
+        name_block = "training script\ntraining code"
+    
+    # Full name (includes namespace/class context)
+    full_name = get("fullName", "")
+    full_name_block = f"Full name: {full_name}" if full_name and full_name != method_name else ""
+    
+    # Signature (includes parameter names - helps with semantic search)
+    signature = get("signature")
+    signature_block = f"Signature: {signature}" if signature else ""
+    
+    # Parameter names separately (for better semantic matching)
+    params = get("paramNames")
+    params_block = f"Parameters: {', '.join(params)}" if params else ""
+    
+    # Code (main semantic content - keep substantial amount)
+    code = get("code")
+    code_block = ""
+    if code:
+        if len(code) > 2000:
+            # Take first 1500 chars (most important) + last 500 (context),
+            # built in one f-string instead of chained concatenations
+            code_block = f"Code:\n{code[:1500]}\n...\n{code[-500:]}"
+        else:
+            code_block = f"Code:\n{code}"
+    
+    # Callees (what this method calls - helps with "who calls X" queries),
+    # without operator calls for a cleaner representation
+    callees = get("callees")
+    callees_block = ""
+    if callees:
+        meaningful_callees = list(filterfalse(OPERATOR_CALLEE_RE.match, callees[:20]))
+        if meaningful_callees:
+            callees_block = f"Calls methods: {', '.join(meaningful_callees)}"
+    
+    return "\n".join(filter(None, (
+        file_head, name_block, full_name_block, signature_block,
+        params_block, code_block, callees_block, file_tail
+    )))
+
+
+def is_real_method(method_name: str, file_path: str, text: str) -> bool:
+    """
+    Whether a method is worth retrieving: not an operator/meta entry, not a tiny
+    helper, with real code and a known file. Stored as the is_real_method metadata
+    field so query.py can filter inside ChromaDB.
+    """
+    if method_name == "<module>":
+        if not MODULE_KEEP_RE.search(file_path.lower()):
+            return False
+    elif (method_name in BAD_METHOD_NAMES or
+          len(method_name) <= 2 or  # Single letter methods are usually operators
+          BAD_METHOD_PREFIX_RE.match(method_name)):
+        return False
+    
+    # Empty or very short code
+    if not text or len(text.strip()) < 30:
+        return False
+    
+    # Unknown files are usually internal/operator methods
+    return bool(file_path) and file_path != "unknown"
+
+
+def _build_representations_chunk(
+    methods: List[Dict[str, Any]],
+    project_name: str,
+    embedding_model_name: str
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """Build texts and metadata for one chunk of methods (runs in worker processes)."""
+    method_texts = []
+    method_metadata = []
+    
+    append_text = method_texts.append
+    append_metadata = method_metadata.append
+    for method in methods:
+        method_text = build_method_text(method)
+        append_text(method_text)
+        
+        # Build metadata in one literal with a local-bound getter
+        mget = method.get
+        method_name = mget("methodName", "")
+        file_path = mget("filePath", "")
+        append_metadata({
+            "project_name": project_name,
+            "method_name": method_name,
+            "full_name": mget("fullName", ""),
+            "file_path": file_path,
+            "line_number": str(mget("lineNumber", 0)),
+            "signature": mget("signature", ""),
+            "is_real_method": is_real_method(method_name, file_path, method_text),
+            "text_hash": text_hash(embedding_model_name, method_text)
+        })
+    
+    return method_texts, method_metadata
+
+
+def build_representations(
+    methods: List[Dict[str, Any]],
+    project_name: str,
+    embedding_model_name: str,
+    max_workers: Optional[int] = None
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    Build the embedded text and ChromaDB metadata for every method.
+    
+    Large method lists are split into chunks built in worker processes;
+    below PARALLEL_MIN_METHODS pickling the methods costs more than it saves.
+    
+    Args:
+        methods: Method dicts from methods.json
+        project_name: Name of the project
+        embedding_model_name: Encoder key folded into each text hash
+        max_workers: Worker processes (default: CPU count, 1 = serial)
+    """
+    chunks = [
+        methods[start:start + REPRESENTATION_CHUNK_SIZE]
+        for start in range(0, len(methods), REPRESENTATION_CHUNK_SIZE)
+    ]
+    workers = min(max_workers or os.cpu_count() or 1, len(chunks))
+    if workers > 1 and len(methods) >= PARALLEL_MIN_METHODS:
+        try:
+            method_texts = []
+            method_metadata = []
+            build_chunk = functools.partial(
+                _build_representations_chunk,
+                project_name=project_name,
+                embedding_model_name=embedding_model_name
+            )
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                for texts, metadata in executor.map(build_chunk, chunks):
+                    method_texts.extend(texts)
+                    method_metadata.extend(metadata)
+            return method_texts, method_metadata
+        except Exception as e:
+            print(f"Warning: Parallel text building failed ({e}), building serially")
+    
+    return _build_representations_chunk(methods, project_name, embedding_model_name)
+
+
 def embed_and_index(
     methods_json: str,
     project_name: str,
     embedding_model_name: str = "microsoft/graphcodebert-base",
-    chromadb_dir: str = "./data/chromadb"
+    chromadb_dir: str = "./data/chromadb",
+    model: Optional[SentenceTransformer] = None,
+    backend: str = "torch",
+    device: str = "auto",
+    precision: str = "auto",
+    batch_size: Optional[int] = None,
+    use_embedding_cache: bool = True,
+    rebuild: bool = False,
+    emb_dim: Optional[int] = None
 ) -> bool:
     """
     Embed methods and index in ChromaDB.
@@ -39,6 +561,16 @@ def embed_and_index(
         project_name: Name of the project (for collection naming)
         embedding_model_name: Name of embedding model
         chromadb_dir: Directory for ChromaDB persistence
+        model: Already loaded embedding model to reuse (loaded on demand if None)
+        backend: Inference backend used when loading the model (see BACKENDS)
+        device: Torch device used when loading the model (see DEVICES)
+        precision: Weight precision used when loading the model (see PRECISIONS)
+        batch_size: Encode batch size (default: per device, see DEFAULT_BATCH_SIZES)
+        use_embedding_cache: Reuse and record vectors in <chromadb_dir>/embedding_cache.sqlite,
+            which is keyed by text hash and shared across collections and runs
+        rebuild: Drop the collection first so it is recreated with HNSW_METADATA
+        emb_dim: Keep only the first emb_dim dimensions (Matryoshka-style); vectors are
+            always stored unit-length
     
     Returns:
         True if successful
@@ -49,164 +581,24 @@ def embed_and_index(
         print(f"Error: Methods JSON file '{methods_json}' does not exist")
         return False
     
-    with open(methods_path, 'r') as f:
-        data = json.load(f)
+    data = load_json(methods_path)
     
     methods = data.get("methods", [])
     if not methods:
         print("Error: No methods found in JSON file")
         return False
     
-    print(f"Loading embedding model '{embedding_model_name}'...")
-    print("Note: Warnings about model weights initialization are expected and can be ignored.")
-    try:
-        # Suppress warnings about model weights initialization when using non-sentence-transformers models
-        # These warnings are expected when using HuggingFace models with sentence-transformers
-        import os
-        import logging
-        
-        # Suppress transformers warnings
-        os.environ["TRANSFORMERS_VERBOSITY"] = "error"
-        logging.getLogger("transformers").setLevel(logging.ERROR)
-        logging.getLogger("sentence_transformers").setLevel(logging.ERROR)
-        
-        with warnings.catch_warnings():
-            warnings.filterwarnings("ignore", category=UserWarning)
-            warnings.filterwarnings("ignore", message=".*Some weights of.*were not initialized.*")
-            warnings.filterwarnings("ignore", message=".*Creating a new one with mean pooling.*")
-            warnings.filterwarnings("ignore", message=".*No sentence-transformers model found.*")
-            model = SentenceTransformer(embedding_model_name)
-        print("✓ Model loaded successfully")
-    except Exception as e:
-        print(f"Error loading embedding model: {e}")
-        return False
+    # Resolved before hashing so the hashes name the backend that actually runs
+    backend = resolve_backend(backend)
     
     # Build text representations
     print("Building method text representations...")
-    method_texts = []
-    method_metadata = []
-    
-    for i, method in enumerate(methods):
-        # Build text representation optimized for semantic retrieval
-        # Structure: Most important info first, then context
-        # This helps embeddings capture the essence of the method
-        text_parts = []
-        
-        # File path FIRST if it contains important keywords (train, eval, test, etc.)
-        # This helps with queries like "where is training" or "where is evaluation"
-        file_path = method.get("filePath", "")
-        method_name = method.get("methodName", "")
-        
-        # Check if file path contains important keywords
-        important_keywords = ["train", "eval", "test", "validation", "infer", "predict"]
-        file_path_lower = file_path.lower()
-        has_important_keyword = any(keyword in file_path_lower for keyword in important_keywords)
-        
-        if file_path and has_important_keyword:
-            # Put file path first for training/eval files (ALWAYS, even for <module>)
-            path_parts = file_path.replace("\\", "/").split("/")
-            if len(path_parts) > 1:
-                text_parts.append(f"File: {'/'.join(path_parts[-2:])}")
-            else:
-                text_parts.append(f"File: {file_path}")
-            # Also include just the filename for emphasis
-            filename = path_parts[-1] if path_parts else file_path
-            text_parts.append(filename)
-            # For training files, add explicit keywords
-            if "train" in file_path_lower:
-                text_parts.append("training")
-                text_parts.append("train")
-        
-        # Method name (most important for semantic matching)
-        # Repeat it for emphasis in the embedding
-        if method_name and method_name != "<module>":
-            text_parts.append(f"Method: {method_name}")
-            # Also include just the name for better matching
-            text_parts.append(method_name)
-            # For "main" methods, add context that it's an entry point
-            if method_name == "main" and has_important_keyword:
-                text_parts.append("entry point main function")
-        elif method_name == "<module>" and has_important_keyword:
-            # For <module> entries in important files, add context
-            if "train" in file_path_lower:
-                text_parts.append("training script")
-                text_parts.append("training code")
-        
-        # Full name (includes namespace/class context)
-        full_name = method.get("fullName", "")
-        if full_name and full_name != method_name:
-            text_parts.append(f"Full name: {full_name}")
-        
-        # Signature (includes parameter names - helps with semantic search)
-        if method.get("signature"):
-            text_parts.append(f"Signature: {method['signature']}")
-        
-        # Parameter names separately (for better semantic matching)
-        if method.get("paramNames"):
-            params = method["paramNames"]
-            if params and len(params) > 0:
-                text_parts.append(f"Parameters: {', '.join(params)}")
-        
-        # Code (main semantic content - keep substantial amount)
-        if method.get("code"):
-            code = method["code"]
-            # Keep more code for better semantic understanding
-            # Prioritize first part of code (usually most important)
-            if len(code) > 2000:
-                # Take first 1500 chars (most important) + last 500 (context)
-                code = code[:1500] + "\n...\n" + code[-500:]
-            text_parts.append(f"Code:\n{code}")
-        
-        # Callees (what this method calls - helps with "who calls X" queries)
-        # Also helps understand what the method does
-        if method.get("callees"):
-            callees = method["callees"]
-            if callees:
-                # Filter out operator calls for cleaner representation
-                meaningful_callees = [c for c in callees[:20] if not c.startswith("<operator")]
-                if meaningful_callees:
-                    text_parts.append(f"Calls methods: {', '.join(meaningful_callees)}")
-        
-        # File path (if not already added at the beginning)
-        if file_path and not has_important_keyword:
-            # Extract meaningful parts of path (directory names can be semantic)
-            path_parts = file_path.replace("\\", "/").split("/")
-            if len(path_parts) > 1:
-                # Include directory context
-                text_parts.append(f"In: {'/'.join(path_parts[-2:])}")
-            else:
-                text_parts.append(f"File: {file_path}")
-        
-        method_text = "\n".join(text_parts)
-        method_texts.append(method_text)
-        
-        # Build metadata
-        metadata = {
-            "project_name": project_name,
-            "method_name": method.get("methodName", ""),
-            "full_name": method.get("fullName", ""),
-            "file_path": method.get("filePath", ""),
-            "line_number": str(method.get("lineNumber", 0)),
-            "signature": method.get("signature", "")
-        }
-        method_metadata.append(metadata)
+    method_texts, method_metadata = build_representations(
+        methods, project_name, encoder_key(embedding_model_name, backend, emb_dim)
+    )
     
     print(f"✓ Built {len(method_texts)} method representations")
     
-    # Generate embeddings
-    print("Generating embeddings...")
-    try:
-        embeddings = model.encode(
-            method_texts,
-            show_progress_bar=True,
-            batch_size=32,
-            convert_to_numpy=True
-        )
-        print(f"✓ Generated {len(embeddings)} embeddings")
-    except Exception as e:
-        print(f"Error generating embeddings: {e}")
-        return False
-    
     # Initialize ChromaDB
     print(f"Initializing ChromaDB at '{chromadb_dir}'...")
     chromadb_path = Path(chromadb_dir)
@@ -219,69 +611,391 @@ def embed_and_index(
     
     collection_name = f"methods_{project_name}"
     
+    collection_metadata = {"description": f"Method embeddings for {project_name}", **HNSW_METADATA}
+    if emb_dim:
+        # query.py reads this to shorten question embeddings the same way
+        collection_metadata["embedding_dim"] = emb_dim
+    
     # Get or create collection
     try:
-        collection = client.get_or_create_collection(
-            name=collection_name,
-            metadata={"description": f"Method embeddings for {project_name}"}
-        )
+        try:
+            collection = client.get_collection(name=collection_name)
+        except Exception:
+            collection = None
+        if collection is not None:
+            # A collection holds vectors of one width, so a new --emb-dim needs a fresh one
+            dim_changed = (collection.metadata or {}).get("embedding_dim") != emb_dim
+            if rebuild or dim_changed:
+                client.delete_collection(name=collection_name)
+                print(f"✓ Dropped collection '{collection_name}' for "
+                      f"{'rebuild' if rebuild else 'new embedding dimension'}")
+                collection = None
+        if collection is None:
+            collection = client.create_collection(name=collection_name, metadata=collection_metadata)
         print(f"✓ Collection '{collection_name}' ready")
     except Exception as e:
         print(f"Error creating collection: {e}")
         return False
     
-    # Add to ChromaDB in batches (ChromaDB has a max batch size limit)
-    print("Indexing methods in ChromaDB...")
+    # Only re-embed methods whose text changed since the last run
+    total_methods = len(methods)
+    ids = [f"{project_name}_{i}" for i in range(total_methods)]
     try:
-        # ChromaDB has a maximum batch size, so we need to split into smaller batches
-        max_batch_size = 5000  # Safe batch size (ChromaDB limit is around 5461)
-        total_methods = len(methods)
-        ids = [f"{project_name}_{i}" for i in range(total_methods)]
-        
-        # Split into batches
-        num_batches = (total_methods + max_batch_size - 1) // max_batch_size
-        print(f"  Adding {total_methods} methods in {num_batches} batch(es)...")
-        
-        for batch_idx in range(num_batches):
-            start_idx = batch_idx * max_batch_size
-            end_idx = min(start_idx + max_batch_size, total_methods)
-            
-            batch_ids = ids[start_idx:end_idx]
-            batch_embeddings = embeddings[start_idx:end_idx].tolist()
-            batch_documents = method_texts[start_idx:end_idx]
-            batch_metadatas = method_metadata[start_idx:end_idx]
-            
-            collection.add(
-                ids=batch_ids,
-                embeddings=batch_embeddings,
-                documents=batch_documents,
-                metadatas=batch_metadatas
-            )
-            
-            print(f"  Batch {batch_idx + 1}/{num_batches}: Added {end_idx - start_idx} methods ({end_idx}/{total_methods} total)")
-        
-        print(f"✓ Indexed {len(methods)} methods in ChromaDB")
+        existing = collection.get(include=["metadatas"])
+        known_metadata = {
+            id_: meta or {}
+            for id_, meta in zip(existing["ids"], existing["metadatas"])
+        }
+    except Exception as e:
+        print(f"Warning: Could not read existing index, re-embedding everything: {e}")
+        known_metadata = {}
+    known = {id_: meta.get("text_hash") for id_, meta in known_metadata.items()}
+    
+    to_encode = [
+        i for i, (id_, metadata) in enumerate(zip(ids, method_metadata))
+        if known.get(id_) != metadata["text_hash"]
+    ]
+    
+    # Unchanged texts whose metadata moved on (new fields such as is_real_method,
+    # shifted line numbers) only get their metadata rewritten
+    encode_set = set(to_encode)
+    to_refresh = [
+        i for i, (id_, metadata) in enumerate(zip(ids, method_metadata))
+        if i not in encode_set and known_metadata[id_] != metadata
+    ]
+    if to_refresh:
+        try:
+            for start in range(0, len(to_refresh), UPSERT_BATCH_SIZE):
+                batch = to_refresh[start:start + UPSERT_BATCH_SIZE]
+                collection.update(
+                    ids=[ids[i] for i in batch],
+                    metadatas=[method_metadata[i] for i in batch]
+                )
+            print(f"✓ Updated metadata for {len(to_refresh)} unchanged methods")
+        except Exception as e:
+            print(f"Warning: Could not update method metadata: {e}")
+    if not to_encode:
+        stale_ids = sorted(set(known) - set(ids))
+        if stale_ids:
+            collection.delete(ids=stale_ids)
+            print(f"✓ Removed {len(stale_ids)} methods no longer in the project")
+        print(f"✓ All {total_methods} methods unchanged, nothing to re-embed")
         print(f"  Collection: {collection_name}")
         print(f"  Total items: {collection.count()}")
+        return True
+    print(f"  {len(to_encode)}/{total_methods} methods new or changed")
+    
+    # Identical texts (getters, trivial __init__s, ...) are embedded once and scattered back
+    unique_texts = {}
+    unique_hashes = []
+    order = []
+    for i in to_encode:
+        u = unique_texts.setdefault(method_texts[i], len(unique_texts))
+        if u == len(unique_hashes):
+            unique_hashes.append(method_metadata[i]["text_hash"])
+        order.append(u)
+    texts = list(unique_texts)
+    
+    # Texts already stored under another id (e.g. methods renumbered by an insertion
+    # earlier in the project) reuse that vector instead of being encoded again.
+    # This has to happen before stale ids are deleted.
+    id_by_hash = {h: id_ for id_, h in known.items() if h}
+    reusable = {u: id_by_hash[h] for u, h in enumerate(unique_hashes) if h in id_by_hash}
+    known_vectors = {}
+    if reusable:
+        try:
+            found = collection.get(ids=list(reusable.values()), include=["embeddings"])
+            stored = dict(zip(found["ids"], found["embeddings"]))
+            known_vectors = {u: stored[id_] for u, id_ in reusable.items() if id_ in stored}
+        except Exception as e:
+            print(f"Warning: Could not read stored embeddings, re-encoding them: {e}")
+    
+    # Then the on-disk cache, which also covers other projects and dropped collections
+    cache = None
+    if use_embedding_cache:
+        cache_path = chromadb_path / "embedding_cache.sqlite"
+        try:
+            cache = open_embedding_cache(cache_path)
+            missing = [u for u in range(len(texts)) if u not in known_vectors]
+            cached = lookup_cached_embeddings(cache, [unique_hashes[u] for u in missing])
+            for u in missing:
+                if unique_hashes[u] in cached:
+                    known_vectors[u] = cached[unique_hashes[u]]
+        except sqlite3.Error as e:
+            print(f"Warning: Could not use embedding cache '{cache_path}': {e}")
+            cache = None
+    to_embed = [u for u in range(len(texts)) if u not in known_vectors]
+    
+    stale_ids = sorted(set(known) - set(ids))
+    if stale_ids:
+        collection.delete(ids=stale_ids)
+        print(f"✓ Removed {len(stale_ids)} methods no longer in the project")
+    
+    # Methods (indices into methods) that share each unique text
+    methods_by_text = [[] for _ in texts]
+    for i, u in zip(to_encode, order):
+        methods_by_text[u].append(i)
+    
+    print("Indexing methods in ChromaDB...")
+    reused = list(known_vectors)
+    if reused:
+        try:
+            indices, rows = _expand_to_methods(reused, methods_by_text)
+            vectors = np.asarray([known_vectors[u] for u in reused], dtype=np.float32)
+            _upsert_methods(
+                collection, indices, _gather_rows(vectors, rows), ids, method_texts, method_metadata
+            )
+            print(f"  Reused stored or cached embeddings for {len(indices)} methods")
+        except Exception as e:
+            print(f"Error indexing in ChromaDB: {e}")
+            return False
+    
+    if to_embed:
+        if model is None:
+            try:
+                model = load_embedding_model(embedding_model_name, backend, device, precision)
+            except Exception as e:
+                print(f"Error loading embedding model: {e}")
+                return False
+        if batch_size is None:
+            batch_size = DEFAULT_BATCH_SIZES.get(model.device.type, 32)
         
-    except Exception as e:
-        print(f"Error indexing in ChromaDB: {e}")
-        return False
+        # Sort longest-first so every batch pads to similarly sized texts across the
+        # whole run (and an OOM shows up on the first batch, not the last)
+        to_embed.sort(key=lambda u: len(texts[u]), reverse=True)
+        
+        num_chunks = (len(to_embed) + ENCODE_CHUNK_SIZE - 1) // ENCODE_CHUNK_SIZE
+        print(f"Generating embeddings for {len(to_embed)} unique texts in {num_chunks} chunk(s)...")
+        # Each chunk is upserted on a writer thread while the next one is encoded,
+        # so only about two chunks of embeddings are ever held in memory.
+        # One progress bar covers the whole run instead of a line per chunk.
+        with ThreadPoolExecutor(max_workers=1) as writer, \
+                tqdm(total=len(to_embed), desc="Embedding", unit="text") as progress:
+            pending = None
+            for chunk_idx in range(num_chunks):
+                chunk = to_embed[chunk_idx * ENCODE_CHUNK_SIZE:(chunk_idx + 1) * ENCODE_CHUNK_SIZE]
+                try:
+                    vectors = postprocess_embeddings(
+                        encode_texts(model, [texts[u] for u in chunk], batch_size, show_progress_bar=False),
+                        emb_dim
+                    )
+                except Exception as e:
+                    print(f"Error generating embeddings: {e}")
+                    return False
+                if cache is not None:
+                    try:
+                        store_cached_embeddings(cache, [unique_hashes[u] for u in chunk], vectors)
+                    except sqlite3.Error as e:
+                        print(f"Warning: Could not write embedding cache: {e}")
+                        cache = None
+                
+                indices, rows = _expand_to_methods(chunk, methods_by_text)
+                try:
+                    if pending is not None:
+                        pending.result()
+                    pending = writer.submit(
+                        _upsert_methods, collection, indices, _gather_rows(vectors, rows),
+                        ids, method_texts, method_metadata
+                    )
+                except Exception as e:
+                    print(f"Error indexing in ChromaDB: {e}")
+                    return False
+                progress.update(len(chunk))
+            
+            try:
+                pending.result()
+            except Exception as e:
+                print(f"Error indexing in ChromaDB: {e}")
+                return False
+    
+    if cache is not None:
+        cache.close()
+    print(f"✓ Indexed {len(to_encode)} methods in ChromaDB")
+    print(f"  Collection: {collection_name}")
+    print(f"  Total items: {collection.count()}")
     
     return True
 
 
+def serve(
+    socket_path: str,
+    embedding_model_name: str,
+    backend: str = "torch",
+    device: str = "auto",
+    precision: str = "auto",
+    batch_size: Optional[int] = None
+) -> None:
+    """
+    Keep embedding models loaded and index projects on request.
+    
+    Listens on a UNIX socket for JSON requests of the form
+    {"methods_json", "project_name", "chromadb_dir"[, "embedding_model", "backend",
+    "use_embedding_cache", "rebuild", "emb_dim"]} and answers {"success": bool}.
+    {"command": "encode", "texts"[, "embedding_model", "backend"]} answers
+    {"success": bool, "shape": [n, dim]} followed by the raw float32 vectors as a
+    second message. {"command": "shutdown"} stops the server.
+    
+    Args:
+        socket_path: Path of the UNIX socket to listen on
+        embedding_model_name: Model to load (and warm up) at startup
+        backend: Backend for the startup model and requests that don't name one
+        device: Device every model of this server is loaded on
+        precision: Precision every model of this server is loaded with
+        batch_size: Encode batch size for every request (default: per device)
+    """
+    from multiprocessing.connection import Listener
+    
+    backend = resolve_backend(backend)
+    default_model = load_embedding_model(embedding_model_name, backend, device, precision)
+    # Run one tiny batch so CUDA kernels and allocator pools are ready before the first request
+    default_model.encode(["def warmup(): pass"], show_progress_bar=False)
+    models = {(embedding_model_name, backend): default_model}
+    
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    with Listener(socket_path, family="AF_UNIX") as listener:
+        print(f"✓ Index server listening on {socket_path}")
+        while True:
+            with listener.accept() as conn:
+                try:
+                    request = json.loads(conn.recv_bytes())
+                except (EOFError, ValueError) as e:
+                    print(f"✗ Ignoring malformed request: {e}")
+                    continue
+                
+                if request.get("command") == "shutdown":
+                    conn.send_bytes(json.dumps({"success": True}).encode())
+                    break
+                
+                key = (
+                    request.get("embedding_model", embedding_model_name),
+                    resolve_backend(request.get("backend", backend))
+                )
+                if request.get("command") == "encode":
+                    try:
+                        if key not in models:
+                            models[key] = load_embedding_model(*key, device=device, precision=precision)
+                        vectors = encode_texts(
+                            models[key],
+                            request["texts"],
+                            batch_size or DEFAULT_BATCH_SIZES.get(models[key].device.type, 32),
+                            show_progress_bar=False
+                        )
+                    except Exception as e:
+                        print(f"✗ Encode request failed: {e}")
+                        conn.send_bytes(json.dumps({"success": False}).encode())
+                        continue
+                    conn.send_bytes(json.dumps({"success": True, "shape": vectors.shape}).encode())
+                    conn.send_bytes(vectors.tobytes())
+                    continue
+                
+                try:
+                    if key not in models:
+                        models[key] = load_embedding_model(*key, device=device, precision=precision)
+                    success = embed_and_index(
+                        request["methods_json"],
+                        request["project_name"],
+                        key[0],
+                        request.get("chromadb_dir", "./data/chromadb"),
+                        model=models[key],
+                        backend=key[1],
+                        batch_size=batch_size,
+                        use_embedding_cache=request.get("use_embedding_cache", True),
+                        rebuild=request.get("rebuild", False),
+                        emb_dim=request.get("emb_dim")
+                    )
+                except Exception as e:
+                    print(f"✗ Request failed: {e}")
+                    success = False
+                conn.send_bytes(json.dumps({"success": success}).encode())
+    
+    print("✓ Index server stopped")
+
+
+def request_index(
+    socket_path: str,
+    methods_json: str,
+    project_name: str,
+    embedding_model_name: str,
+    chromadb_dir: str,
+    backend: str = "torch",
+    use_embedding_cache: bool = True,
+    rebuild: bool = False,
+    emb_dim: Optional[int] = None
+) -> Optional[bool]:
+    """
+    Ask a running index server to embed and index a project.
+    
+    Args:
+        use_embedding_cache, rebuild, emb_dim: Passed on to the server's embed_and_index call
+    
+    Returns:
+        The server's success flag, or None if no server is reachable
+    """
+    from multiprocessing.connection import Client
+    
+    try:
+        conn = Client(socket_path, family="AF_UNIX")
+    except OSError:
+        return None
+    with conn:
+        # Paths are resolved here since the server may run in another directory
+        conn.send_bytes(json.dumps({
+            "methods_json": str(Path(methods_json).resolve()),
+            "project_name": project_name,
+            "embedding_model": embedding_model_name,
+            "backend": backend,
+            "chromadb_dir": str(Path(chromadb_dir).resolve()),
+            "use_embedding_cache": use_embedding_cache,
+            "rebuild": rebuild,
+            "emb_dim": emb_dim,
+        }).encode())
+        return bool(json.loads(conn.recv_bytes()).get("success", False))
+
+
+def request_encode(
+    socket_path: str,
+    texts: List[str],
+    embedding_model_name: str,
+    backend: str = "torch"
+) -> Optional[np.ndarray]:
+    """
+    Encode texts with the model a running index server keeps loaded.
+    
+    Returns:
+        float32 array of shape (len(texts), dim) as encode_texts would return it,
+        or None if no server is reachable or the request failed
+    """
+    from multiprocessing.connection import Client
+    
+    try:
+        conn = Client(socket_path, family="AF_UNIX")
+    except OSError:
+        return None
+    with conn:
+        conn.send_bytes(json.dumps({
+            "command": "encode",
+            "texts": texts,
+            "embedding_model": embedding_model_name,
+            "backend": backend,
+        }).encode())
+        reply = json.loads(conn.recv_bytes())
+        if not reply.get("success"):
+            return None
+        return np.frombuffer(conn.recv_bytes(), dtype=np.float32).reshape(reply["shape"])
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Embed methods and index in ChromaDB"
     )
     parser.add_argument(
         "methods_json",
+        nargs="?",
         help="Path to JSON file with extracted methods"
     )
     parser.add_argument(
         "--project-name", "-p",
-        required=True,
         help="Project name (for collection naming)"
     )
     parser.add_argument(
@@ -294,14 +1008,115 @@ def main():
         default="./data/chromadb",
         help="ChromaDB persistence directory (default: ./data/chromadb)"
     )
+    parser.add_argument(
+        "--backend",
+        choices=BACKENDS,
+        default="torch",
+        help="Encoder backend; onnx, onnx-int8 (quantized) and openvino export the model once "
+             "and run it on CPU (default: torch)"
+    )
+    parser.add_argument(
+        "--device",
+        choices=DEVICES,
+        default="auto",
+        help="Device for the torch backend (default: auto, i.e. CUDA, then MPS, then CPU)"
+    )
+    parser.add_argument(
+        "--precision",
+        choices=PRECISIONS,
+        default="auto",
+        help="Weight precision for the torch backend (default: auto, i.e. fp16 on CUDA/MPS, fp32 on CPU)"
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Drop and recreate the project's collection (e.g. to apply new HNSW settings); "
+             "cached embeddings are reused"
+    )
+    parser.add_argument(
+        "--emb-dim",
+        type=int,
+        default=None,
+        help="Store only the first N embedding dimensions, renormalized (smaller, faster index; "
+             "best with Matryoshka-trained models). Changing it rebuilds the collection"
+    )
+    parser.add_argument(
+        "--no-embedding-cache",
+        action="store_true",
+        help="Don't read or write the per-text embedding cache (<chromadb-dir>/embedding_cache.sqlite)"
+    )
+    parser.add_argument(
+        "--threads",
+        type=int,
+        default=None,
+        help="Torch CPU threads for encoding (default: OMP_NUM_THREADS or CPU count, at most 8)"
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=None,
+        help="Encode batch size (default: 128 on CUDA, 64 on MPS, 32 on CPU)"
+    )
+    
+    parser.add_argument(
+        "--server",
+        metavar="SOCKET",
+        help="Run as a long-lived server on this UNIX socket, keeping the model loaded"
+    )
+    parser.add_argument(
+        "--connect",
+        metavar="SOCKET",
+        help="Send the request to a server on this socket (falls back to indexing in-process)"
+    )
     
     args = parser.parse_args()
+    if args.emb_dim is not None and args.emb_dim < 1:
+        parser.error("--emb-dim must be a positive number of dimensions")
+    
+    configure_torch_threads(args.threads)
+    
+    if args.server:
+        serve(
+            args.server,
+            args.embedding_model,
+            args.backend,
+            args.device,
+            args.precision,
+            args.batch_size
+        )
+        sys.exit(0)
+    
+    if not args.methods_json or not args.project_name:
+        parser.error("methods_json and --project-name are required unless --server is given")
+    
+    if args.connect:
+        success = request_index(
+            args.connect,
+            args.methods_json,
+            args.project_name,
+            args.embedding_model,
+            args.chromadb_dir,
+            args.backend,
+            use_embedding_cache=not args.no_embedding_cache,
+            rebuild=args.rebuild,
+            emb_dim=args.emb_dim
+        )
+        if success is not None:
+            sys.exit(0 if success else 1)
+        print(f"No index server at {args.connect}, indexing in-process")
     
     success = embed_and_index(
         args.methods_json,
         args.project_name,
         args.embedding_model,
-        args.chromadb_dir
+        args.chromadb_dir,
+        backend=args.backend,
+        device=args.device,
+        precision=args.precision,
+        batch_size=args.batch_size,
+        use_embedding_cache=not args.no_embedding_cache,
+        rebuild=args.rebuild,
+        emb_dim=args.emb_dim
     )
     sys.exit(0 if success else 1)
 
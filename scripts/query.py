@@ -5,20 +5,136 @@ Performs semantic retrieval, graph expansion, and LLM reasoning.
 """
 
 import argparse
+import atexit
+import functools
+import importlib.util
 import json
 import re
+import socket
+import sqlite3
 import subprocess
 import sys
+import time
+import urllib.request
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple
 
 import chromadb
 from chromadb.config import Settings
+import numpy as np
 from sentence_transformers import SentenceTransformer
 from transformers import AutoTokenizer, AutoModelForCausalLM
 import torch
 import yaml
 
+from cpg_json import load_json
+
+from index_methods import (
+    BACKENDS,
+    HNSW_METADATA,
+    is_real_method,
+    lookup_cached_embeddings,
+    load_embedding_model,
+    open_embedding_cache,
+    request_encode,
+    resolve_backend,
+    store_cached_embeddings,
+    text_hash,
+)
+
+# Answer clean-up patterns, compiled once instead of on every generate_answer call
+# Variable names like tmp0/manager_tmp mark CPG representations rather than source code
+_CPG_ARTIFACT_RE = re.compile(r'tmp\d+|__iter__|__next__|manager_tmp')
+_METHOD_HEADER_RE = re.compile(r'--- Method \d+:')
+_METHOD_BLOCK_RE = re.compile(r'--- Method \d+:.*?---')
+_CALLED_BY_LINE_RE = re.compile(r'^Called by:.*$', re.MULTILINE)
+_CALLS_LINE_RE = re.compile(r'^Calls:.*$', re.MULTILINE)
+_FRAGMENT_LINE_RE = re.compile(r'^[,\s\w]+$')
+# "1." .. "9." or "**" at the start of a line
+_NUMBERED_LINE_RE = re.compile(r'[1-9]\.|\*\*')
+_REPEATED_CHAR_RE = re.compile(r'(.)\1{3,}')
+_ADJACENT_QUOTES_RE = re.compile(r'"[^"]*"\s*"[^"]*"')
+
+# Prompt instructions that leak into answers; none is a prefix of another, so the
+# alternation matches the same phrase the old per-phrase loop found
+_INSTRUCTION_PHRASE_RE = re.compile("|".join(map(re.escape, (
+    "for example:",
+    "avoid speculation",
+    "only provide information",
+    "based on the data given",
+    "do not make assumptions",
+    "question:",
+    "to answer this question",
+    "i need to identify",
+    "given the current information",
+    "i cannot definitively",
+    "therefore, my answer is:",
+    "to identify the specific",
+    "calls sections",
+    "avoid assumptions",
+    "only include information",
+    "don't guess or assume"
+))))
+_INSTRUCTION_WORD_RE = re.compile(r"avoid|only|don't|do not|include|provide")
+# Meta-commentary, lowercased once; checked in priority order (see _trim_meta_commentary)
+_META_PHRASES = tuple(phrase.lower() for phrase in (
+    "Please provide the most appropriate answer",
+    "Based on the given code and relationships",
+    "I cannot provide",
+    "I don't have enough information",
+    "Please provide",
+    "I need more information",
+    "I would need to see",
+    "Without more context",
+    "USE THE INFORMATION",
+    "Your task is clear",
+    "Please confirm",
+    "before I provide"
+))
+_META_LINE_RE = re.compile("|".join(map(re.escape, (
+    "please provide the most appropriate",
+    "based on the given code and relationships",
+    "i cannot provide",
+    "i don't have enough"
+))))
+
+# Fixed parts of the LLM prompt, built once (see build_prompt)
+_SEP80 = "=" * 80
+_PROMPT_QUESTION_HEADER = "\n".join((
+    "\nBelow is relevant code and relationship information to help answer this question.",
+    "\n" + _SEP80,
+    "QUESTION",
+    _SEP80,
+))
+_PROMPT_METHODS_HEADER = "\n".join((
+    _SEP80,
+    "RELEVANT CODE METHODS",
+    _SEP80,
+    "(Methods are ordered by semantic relevance to your question)",
+    "IMPORTANT: Review ALL methods below - even if a method appears later in the list, it may still be highly relevant to your question.",
+))
+_PROMPT_RELATIONSHIPS_HEADER = "\n".join((
+    "\n" + _SEP80,
+    "CODE RELATIONSHIPS",
+    _SEP80,
+    "IMPORTANT: The relationships below show which methods call the methods above.",
+    "Pay special attention to class names and file paths in the 'Called by' section -",
+    "they often reveal the main components and algorithms in the codebase.",
+))
+_PROMPT_INSTRUCTIONS = "\n".join((
+    "\n" + _SEP80,
+    "INSTRUCTIONS",
+    _SEP80,
+    "You are a code analysis assistant. Based on the code methods and relationships shown above, answer the following question in natural language.",
+    "",
+    "IMPORTANT: Write a natural language answer. Do NOT copy or repeat:",
+    "- Method names with '--- Method X: name ---' format",
+    "- 'Called by:' or 'Calls:' lines",
+    "- Code fragments or variable names",
+    "",
+    "Instead, explain what the functions do in plain English.",
+))
+
 
 def load_config() -> Dict[str, Any]:
     """Load configuration from config.yaml"""
@@ -29,218 +145,749 @@ def load_config() -> Dict[str, Any]:
     return {}
 
 
-def retrieve_methods(
-    question: str,
+@functools.lru_cache(maxsize=2)
+def _get_embedding_model(model_name: str, device: str, backend: str = "torch") -> SentenceTransformer:
+    """
+    Load a SentenceTransformer once per (model, device, backend) and keep it resident.
+    
+    The exported CPU backends (e.g. onnx-int8) are shared with index_methods.py,
+    which exports the model on first use.
+    """
+    if backend != "torch":
+        return load_embedding_model(model_name, backend)
+    model = SentenceTransformer(model_name, device=device)
+    # Half precision runs the encoder on tensor cores; the vectors are cast
+    # back to float32 before they reach ChromaDB
+    if device == "cuda":
+        model.half()
+    return model
+
+
+@functools.lru_cache(maxsize=8)
+def _get_collection(chromadb_dir: str, project_name: str):
+    """
+    Open the ChromaDB collection for a project once and reuse it.
+    
+    Raises if the collection does not exist; failed lookups are not cached,
+    so a collection created later is picked up on the next call.
+    """
+    client = chromadb.PersistentClient(
+        path=chromadb_dir,
+        settings=Settings(anonymized_telemetry=False)
+    )
+    return client.get_collection(name=f"methods_{project_name}")
+
+
+# hnsw ef_search per --ann-profile: candidates examined per query (recall vs latency).
+# "balanced" is index_methods.py's HNSW_METADATA value; M and construction_ef are
+# fixed when the collection is built
+ANN_PROFILES = {"fast": 32, "balanced": 128, "recall": 256}
+
+
+def apply_ann_profile(chromadb_dir: str, project_name: str, profile: str) -> Optional[int]:
+    """
+    Set the collection's HNSW search breadth (ef_search) to an ANN_PROFILES entry.
+    
+    ChromaDB stores the value with the collection, so the caller puts the returned
+    previous value back with restore_ef_search once retrieval is done; otherwise
+    later queries (and app.py) would keep the profile. Needs chromadb>=1.0
+    (collection configuration); older versions fix ef_search when the index is created.
+    
+    Returns:
+        The ef_search to restore afterwards, or None if the profile could not be applied
+    """
+    ef_search = ANN_PROFILES[profile]
+    try:
+        collection = _get_collection(chromadb_dir, project_name)
+        current = (getattr(collection, "configuration", None) or {}).get("hnsw") or {}
+        previous = current.get("ef_search", HNSW_METADATA["hnsw:search_ef"])
+        if previous != ef_search:
+            collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+    except TypeError:
+        print("Warning: --ann-profile needs chromadb>=1.0. Using the index's search_ef.")
+        return None
+    except Exception as e:
+        print(f"Warning: Could not apply ANN profile '{profile}': {e}")
+        return None
+    return previous
+
+
+def restore_ef_search(chromadb_dir: str, project_name: str, ef_search: int) -> None:
+    """Put back the ef_search that apply_ann_profile replaced."""
+    try:
+        collection = _get_collection(chromadb_dir, project_name)
+        current = (getattr(collection, "configuration", None) or {}).get("hnsw") or {}
+        if current.get("ef_search") != ef_search:
+            collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+    except Exception as e:
+        print(f"Warning: Could not restore the collection's ef_search ({ef_search}): {e}")
+
+
+def _encode_raw_questions(
+    embedding_model: Optional[SentenceTransformer],
+    questions: List[str],
+    batch_size: int,
+    embedding_model_name: Optional[str],
+    embedding_device: str,
+    embedding_server: Optional[str] = None,
+    embedding_backend: str = "torch"
+) -> np.ndarray:
+    """
+    Encode questions to float32. Without a model, a running index server is tried
+    first, then the cached model is loaded on demand.
+    """
+    if embedding_model is None:
+        if embedding_server:
+            embeddings = request_encode(embedding_server, questions, embedding_model_name, embedding_backend)
+            if embeddings is not None:
+                return embeddings
+            print(f"Warning: Could not encode on index server {embedding_server}, loading the embedding model in-process")
+        embedding_model = _get_embedding_model(embedding_model_name, embedding_device, embedding_backend)
+    # encode() already length-sorts its input and pads each batch only to its
+    # own longest question, so mixed-length batches need no bucketing here
+    return embedding_model.encode(
+        questions,
+        batch_size=batch_size,
+        convert_to_numpy=True,
+        show_progress_bar=False
+    ).astype(np.float32, copy=False)
+
+
+def encode_questions(
+    embedding_model: Optional[SentenceTransformer],
+    questions: List[str],
+    collection_metadata: Optional[Dict[str, Any]] = None,
+    batch_size: int = 32,
+    embedding_model_name: Optional[str] = None,
+    embedding_device: str = "cpu",
+    cache_path: Optional[Path] = None,
+    embedding_server: Optional[str] = None,
+    embedding_backend: str = "torch"
+) -> np.ndarray:
+    """
+    Encode questions in one batched call and shape them like the indexed vectors.
+    
+    Args:
+        embedding_model: Embedding model for encoding (None = load embedding_model_name
+            only if some question is not cached)
+        questions: Questions to encode
+        collection_metadata: Metadata of the collection the vectors will be queried against
+        batch_size: Encoder batch size
+        embedding_model_name: Model name; keys the query cache and loads the model when needed
+        embedding_device: Device used when the model has to be loaded here
+        cache_path: SQLite embedding cache (index_methods.py's format) for raw question vectors
+        embedding_server: Socket of an index_methods.py --server to encode on instead
+        embedding_backend: Encoder backend (see index_methods.BACKENDS)
+    
+    Returns:
+        float32 array of shape (len(questions), dim)
+    """
+    cache = None
+    if cache_path is not None and embedding_model_name:
+        try:
+            cache = open_embedding_cache(cache_path)
+        except sqlite3.Error as e:
+            print(f"Warning: Could not use query embedding cache '{cache_path}': {e}")
+    
+    if cache is None:
+        embeddings = _encode_raw_questions(
+            embedding_model, questions, batch_size, embedding_model_name, embedding_device,
+            embedding_server, embedding_backend
+        )
+    else:
+        # Raw (unshortened, unnormalised) vectors are cached so one entry serves
+        # every collection; "#query" keeps them apart from indexed method texts, and
+        # exported backends get their own entries like in index_methods.encoder_key
+        encoder = embedding_model_name if embedding_backend == "torch" else f"{embedding_model_name}@{embedding_backend}"
+        hashes = [text_hash(f"{encoder}#query", q) for q in questions]
+        try:
+            cached = lookup_cached_embeddings(cache, hashes)
+            missing = [i for i, h in enumerate(hashes) if h not in cached]
+            if missing:
+                encoded = _encode_raw_questions(
+                    embedding_model, [questions[i] for i in missing], batch_size,
+                    embedding_model_name, embedding_device, embedding_server, embedding_backend
+                )
+                store_cached_embeddings(cache, [hashes[i] for i in missing], encoded)
+                cached.update(zip((hashes[i] for i in missing), encoded))
+            embeddings = np.stack([cached[h] for h in hashes])
+        except sqlite3.Error as e:
+            print(f"Warning: Query embedding cache failed ({e}), encoding directly")
+            embeddings = _encode_raw_questions(
+                embedding_model, questions, batch_size, embedding_model_name, embedding_device,
+                embedding_server, embedding_backend
+            )
+        finally:
+            cache.close()
+    
+    # Collections indexed with --emb-dim hold shortened vectors, and inner-product
+    # collections hold unit vectors; the questions have to match both
+    collection_metadata = collection_metadata or {}
+    emb_dim = collection_metadata.get("embedding_dim")
+    if emb_dim:
+        embeddings = embeddings[:, :emb_dim]
+    if emb_dim or collection_metadata.get("hnsw:space") == "ip":
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        embeddings = embeddings / np.maximum(norms, 1e-12)
+    # ChromaDB takes the float32 matrix as is, without boxing every value into a list
+    return np.ascontiguousarray(embeddings, dtype=np.float32)
+
+
+def retrieve_methods_batch(
+    questions: List[str],
     project_name: str,
-    embedding_model: SentenceTransformer,
+    embedding_model: Optional[SentenceTransformer],
     chromadb_dir: str,
     top_k: int = 5,
-    filter_modules: bool = True
-) -> List[Dict[str, Any]]:
+    filter_modules: bool = True,
+    batch_size: int = 32,
+    embedding_model_name: Optional[str] = None,
+    embedding_device: str = "cpu",
+    use_query_cache: bool = True,
+    embedding_server: Optional[str] = None,
+    embedding_backend: str = "torch"
+) -> List[List[Dict[str, Any]]]:
     """
-    Retrieve top-K methods from ChromaDB based on semantic similarity.
+    Retrieve top-K methods for several questions with one encode and one ChromaDB query.
     
     Args:
-        question: User's question
+        questions: User questions
         project_name: Project name for ChromaDB collection
-        embedding_model: Embedding model for encoding
+        embedding_model: Embedding model for encoding (None = load embedding_model_name
+            on demand)
         chromadb_dir: ChromaDB directory
-        top_k: Number of methods to retrieve
+        top_k: Number of methods to retrieve per question
         filter_modules: If True, filter out <module> entries and retrieve more to compensate
+        batch_size: Encoder batch size
+        embedding_model_name: Model name; needed for the query cache and for lazy loading
+        embedding_device: Device for a lazily loaded model
+        use_query_cache: Reuse question vectors from <chromadb_dir>/embedding_cache.sqlite
+        embedding_server: Socket of an index_methods.py --server that keeps the model loaded
+        embedding_backend: Encoder backend for the model (see index_methods.BACKENDS)
     
     Returns:
-        List of method dictionaries with metadata
+        One list of method dictionaries per question, in input order
     """
-    # Initialize ChromaDB client
-    client = chromadb.PersistentClient(
-        path=chromadb_dir,
-        settings=Settings(anonymized_telemetry=False)
-    )
-    
     collection_name = f"methods_{project_name}"
     
     try:
-        collection = client.get_collection(name=collection_name)
+        collection = _get_collection(chromadb_dir, project_name)
     except Exception as e:
         print(f"Error: Collection '{collection_name}' not found: {e}")
         print(f"Please run index_methods.py first to create the index")
+        return [[] for _ in questions]
+    
+    if not questions:
         return []
     
-    # Embed the question directly - rely on semantic similarity
+    # Embed the questions directly - rely on semantic similarity
     # The improved text representations in the index should handle good retrieval
-    question_embedding = embedding_model.encode(question, convert_to_numpy=True)
+    question_embeddings = encode_questions(
+        embedding_model, questions, collection.metadata, batch_size=batch_size,
+        embedding_model_name=embedding_model_name,
+        embedding_device=embedding_device,
+        cache_path=Path(chromadb_dir) / "embedding_cache.sqlite" if use_query_cache else None,
+        embedding_server=embedding_server,
+        embedding_backend=embedding_backend
+    )
     
-    # Query more results if filtering modules to ensure we get enough non-module methods
-    # Use a larger multiplier to ensure we get enough results after filtering
-    query_k = top_k * 20 if filter_modules else top_k
+    if not filter_modules:
+        results = collection.query(
+            query_embeddings=question_embeddings,
+            n_results=top_k,
+            include=["documents", "metadatas", "distances"]
+        )
+        return [_select_methods(results, row, top_k, False) for row in range(len(questions))]
     
-    # Query ChromaDB with semantic similarity
-    results = collection.query(
-        query_embeddings=[question_embedding.tolist()],
-        n_results=query_k,
-        include=["documents", "metadatas", "distances"]
-    )
+    # Let ChromaDB filter on the is_real_method flag written at index time, so
+    # only top_k rows come back instead of top_k * 20 to filter here
+    selected = [[] for _ in questions]
+    try:
+        results = collection.query(
+            query_embeddings=question_embeddings,
+            n_results=top_k,
+            where={"is_real_method": True},
+            include=["documents", "metadatas", "distances"]
+        )
+        selected = [_select_methods(results, row, top_k, False) for row in range(len(questions))]
+    except Exception as e:
+        print(f"Warning: Filtered ChromaDB query failed ({e}), filtering client-side")
     
+    # Questions with too few real methods (or collections indexed before the flag
+    # existed) go through the client-side filter with its fallback pass.
+    # Query more results to ensure we get enough after filtering
+    short_rows = [row for row, methods in enumerate(selected) if len(methods) < top_k]
+    if short_rows:
+        # Documents are the bulk of each row; only the selected methods need them,
+        # unless the collection predates the is_real_method flag
+        results = collection.query(
+            query_embeddings=question_embeddings[short_rows],
+            n_results=top_k * 20,
+            include=["metadatas", "distances"]
+        )
+        unflagged = {
+            id_
+            for ids, metadatas in zip(results["ids"], results["metadatas"])
+            for id_, metadata in zip(ids, metadatas)
+            if "is_real_method" not in metadata
+        }
+        documents = _fetch_documents(collection, unflagged)
+        results["documents"] = [[documents.get(id_) for id_ in ids] for ids in results["ids"]]
+        
+        for i, row in enumerate(short_rows):
+            selected[row] = _select_methods(results, i, top_k, True)
+        
+        needed = {m["id"] for row in short_rows for m in selected[row] if m["document"] is None}
+        documents = _fetch_documents(collection, needed)
+        for row in short_rows:
+            for method in selected[row]:
+                if method["document"] is None:
+                    method["document"] = documents.get(method["id"], "")
+    
+    return selected
+
+
+def _fetch_documents(collection, ids) -> Dict[str, str]:
+    """Fetch the stored documents for a set of ids."""
+    if not ids:
+        return {}
+    found = collection.get(ids=list(ids), include=["documents"])
+    return dict(zip(found["ids"], found["documents"]))
+
+
+def retrieve_methods(
+    question: str,
+    project_name: str,
+    embedding_model: Optional[SentenceTransformer],
+    chromadb_dir: str,
+    top_k: int = 5,
+    filter_modules: bool = True,
+    embedding_model_name: Optional[str] = None,
+    embedding_device: str = "cpu",
+    use_query_cache: bool = True,
+    embedding_server: Optional[str] = None,
+    embedding_backend: str = "torch"
+) -> List[Dict[str, Any]]:
+    """
+    Retrieve top-K methods from ChromaDB based on semantic similarity.
+    
+    Args:
+        question: User's question
+        project_name: Project name for ChromaDB collection
+        embedding_model: Embedding model for encoding (None = load embedding_model_name
+            on demand)
+        chromadb_dir: ChromaDB directory
+        top_k: Number of methods to retrieve
+        filter_modules: If True, filter out <module> entries and retrieve more to compensate
+        embedding_model_name: Model name; needed for the query cache and for lazy loading
+        embedding_device: Device for a lazily loaded model
+        use_query_cache: Reuse question vectors from <chromadb_dir>/embedding_cache.sqlite
+        embedding_server: Socket of an index_methods.py --server that keeps the model loaded
+        embedding_backend: Encoder backend for the model (see index_methods.BACKENDS)
+    
+    Returns:
+        List of method dictionaries with metadata
+    """
+    return retrieve_methods_batch(
+        [question], project_name, embedding_model, chromadb_dir, top_k, filter_modules,
+        embedding_model_name=embedding_model_name,
+        embedding_device=embedding_device,
+        use_query_cache=use_query_cache,
+        embedding_server=embedding_server,
+        embedding_backend=embedding_backend
+    )[0]
+
+
+def _select_methods(
+    results: Dict[str, Any],
+    row: int,
+    top_k: int,
+    filter_modules: bool
+) -> List[Dict[str, Any]]:
+    """Filter one row of a ChromaDB query result down to the top-K usable methods."""
     methods = []
-    if results["ids"] and len(results["ids"][0]) > 0:
-        # First pass: collect non-module methods
-        for i in range(len(results["ids"][0])):
-            metadata = results["metadatas"][0][i]
+    if not results["ids"] or len(results["ids"][row]) == 0:
+        return methods
+    
+    ids = results["ids"][row]
+    documents = results["documents"][row]
+    metadatas = results["metadatas"][row]
+    distances = results["distances"][row] if results["distances"] else None
+    
+    # First pass: collect non-module methods
+    for i, metadata in enumerate(metadatas):
+        method_name = metadata.get("method_name", "")
+        
+        # Filter out <module> and operator entries if requested
+        if filter_modules:
+            file_path = metadata.get("file_path", "")
+            
+            # Same predicate index_methods.py stores as is_real_method: no operators,
+            # meta methods or tiny helpers, <module> only from important files,
+            # real code and a known file
+            real = metadata.get("is_real_method")
+            if real is None:
+                real = is_real_method(method_name, file_path, documents[i])
+            if not real:
+                continue
+        
+        methods.append({
+            "id": ids[i],
+            "document": documents[i],
+            "metadata": metadata,
+            "distance": distances[i] if distances else None
+        })
+        
+        # Stop when we have enough non-module methods
+        if len(methods) >= top_k:
+            break
+    
+    # Second pass: if we don't have enough, include modules as fallback
+    # but only if they're semantically relevant (not too far in distance)
+    if len(methods) < top_k and filter_modules:
+        max_distance = None
+        if methods:
+            # Use the worst distance from collected methods as threshold
+            max_distance = max(m.get("distance", 1.0) for m in methods if m.get("distance") is not None)
+            if max_distance:
+                # Be more lenient: allow 2.5x worse distance, but cap at 0.9 (more permissive)
+                max_distance = min(max_distance * 2.5, 0.9)
+        else:
+            # If no methods found yet, be very permissive (allow up to 0.9 distance)
+            max_distance = 0.9
+        
+        seen_names = {m["metadata"].get("method_name") for m in methods}
+        for i, metadata in enumerate(metadatas):
+            if len(methods) >= top_k:
+                break
+            
             method_name = metadata.get("method_name", "")
+            distance = distances[i] if distances else None
             
-            # Filter out <module> and operator entries if requested
-            if filter_modules:
-                file_path = metadata.get("file_path", "")
-                file_path_lower = file_path.lower()
-                
-                # Don't filter <module> entries from important files (train, eval, test, etc.)
-                # These often contain the main logic
-                important_keywords = ["train", "eval", "test", "validation", "infer", "predict", "main"]
-                is_important_file = any(keyword in file_path_lower for keyword in important_keywords)
-                
-                # Filter out low-level operators and meta methods
-                # But keep <module> from important files
-                if method_name == "<module>":
-                    if not is_important_file:
-                        continue
-                elif (method_name.startswith("<operator") or 
-                    method_name.startswith("<init") or
-                    method_name.startswith("<meta") or
-                    method_name == "item" or
-                    method_name == "keys" or
-                    method_name == "t" or
-                    method_name == "__iter__" or
-                    method_name == "__next__" or
-                    len(method_name) <= 2):  # Single letter methods are usually operators
-                    continue
-                
-                # Filter out methods with empty or very short code (relaxed threshold)
-                document = results["documents"][0][i]
-                if not document or len(document.strip()) < 30:
-                    continue
-                
-                # Filter out methods from unknown files (usually internal/operator methods)
-                file_path = metadata.get("file_path", "")
-                if file_path == "unknown" or not file_path:
-                    continue
+            # Apply same filtering as first pass
+            if method_name == "<module>" or method_name.startswith(("<operator", "<init")):
+                continue
             
-            method = {
-                "id": results["ids"][0][i],
-                "document": results["documents"][0][i],
-                "metadata": metadata,
-                "distance": results["distances"][0][i] if results["distances"] else None
-            }
-            methods.append(method)
+            # Skip if already added
+            if method_name in seen_names:
+                continue
             
-            # Stop when we have enough non-module methods
-            if len(methods) >= top_k:
-                break
-        
-        # Second pass: if we don't have enough, include modules as fallback
-        # but only if they're semantically relevant (not too far in distance)
-        if len(methods) < top_k and filter_modules:
-            max_distance = None
-            if methods:
-                # Use the worst distance from collected methods as threshold
-                max_distance = max(m.get("distance", 1.0) for m in methods if m.get("distance") is not None)
-                if max_distance:
-                    # Be more lenient: allow 2.5x worse distance, but cap at 0.9 (more permissive)
-                    max_distance = min(max_distance * 2.5, 0.9)
-            else:
-                # If no methods found yet, be very permissive (allow up to 0.9 distance)
-                max_distance = 0.9
+            # Only include if distance is reasonable
+            if max_distance and distance and distance > max_distance:
+                continue
             
-            for i in range(len(results["ids"][0])):
-                if len(methods) >= top_k:
-                    break
-                
-                metadata = results["metadatas"][0][i]
-                method_name = metadata.get("method_name", "")
-                distance = results["distances"][0][i] if results["distances"] else None
-                
-                # Apply same filtering as first pass
-                if filter_modules:
-                    if method_name == "<module>" or method_name.startswith("<operator") or method_name.startswith("<init"):
-                        continue
-                
-                # Skip if already added
-                if any(m["metadata"].get("method_name") == method_name for m in methods):
-                    continue
-                
-                # Only include if distance is reasonable
-                if max_distance and distance and distance > max_distance:
-                    continue
-                
-                method = {
-                    "id": results["ids"][0][i],
-                    "document": results["documents"][0][i],
-                    "metadata": metadata,
-                    "distance": distance
-                }
-                methods.append(method)
+            methods.append({
+                "id": ids[i],
+                "document": documents[i],
+                "metadata": metadata,
+                "distance": distance
+            })
+            seen_names.add(method_name)
     
     return methods[:top_k]
 
 
-def get_graph_neighborhood(
+GRAPH_NEIGHBORHOOD_SCRIPT = Path(__file__).parent.parent / "joern_scripts" / "get_graph_neighborhood.sc"
+# Same directory extract_methods.py keeps its Joern results in
+NEIGHBORHOOD_CACHE_PATH = Path(__file__).parent.parent / ".joern_cache" / "neighborhoods.sqlite"
+
+
+class JoernClient:
+    """
+    Client for a resident `joern --server`, so graph queries skip JVM startup and CPG loading.
+    
+    Connects to a server already listening on host:port, or spawns one on first use
+    (and shuts it down at exit). The helpers from get_graph_neighborhood.sc are defined
+    in the server session once, and the CPG is only reloaded when the path changes.
+    """
+    
+    def __init__(self, host: str = "127.0.0.1", port: int = 8080, startup_timeout: float = 120.0):
+        self.host = host
+        self.port = port
+        self.startup_timeout = startup_timeout
+        self._process = None
+        self._helpers_loaded = False
+        self._loaded_cpg = None
+    
+    def _is_listening(self) -> bool:
+        try:
+            with socket.create_connection((self.host, self.port), timeout=1):
+                return True
+        except OSError:
+            return False
+    
+    def start(self):
+        """Spawn the Joern server unless one is already listening, and wait until it accepts connections."""
+        if self._is_listening():
+            return
+        
+        print(f"Starting Joern server on {self.host}:{self.port}...")
+        self._process = subprocess.Popen(
+            ["joern", "--server", "--server-host", self.host, "--server-port", str(self.port)],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL
+        )
+        atexit.register(self.shutdown)
+        
+        deadline = time.monotonic() + self.startup_timeout
+        while not self._is_listening():
+            if self._process.poll() is not None:
+                raise RuntimeError(f"Joern server exited with code {self._process.returncode}")
+            if time.monotonic() > deadline:
+                self.shutdown()
+                raise RuntimeError(f"Joern server did not start within {self.startup_timeout:.0f}s")
+            time.sleep(0.5)
+        print("✓ Joern server ready")
+    
+    def query(self, query: str, timeout: float = 300.0) -> str:
+        """
+        Run a Scala query synchronously on the server.
+        
+        Returns:
+            The query's stdout
+        """
+        request = urllib.request.Request(
+            f"http://{self.host}:{self.port}/query-sync",
+            data=json.dumps({"query": query}).encode("utf-8"),
+            headers={"Content-Type": "application/json"}
+        )
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            result = json.loads(response.read())
+        if not result.get("success", False):
+            raise RuntimeError(f"Joern query failed: {result.get('stdout', '')[:500]}")
+        return result.get("stdout", "")
+    
+    def neighborhoods(self, cpg_path: str, specs_json: str) -> str:
+        """
+        Run the batch neighborhood query for a CPG.
+        
+        Returns:
+            Raw output containing the {"results": [...]} JSON
+        """
+        self.start()
+        
+        if not self._helpers_loaded:
+            # Everything before @main: the helper definitions, without the script entry point
+            script = GRAPH_NEIGHBORHOOD_SCRIPT.read_text().split("\n@main", 1)[0]
+            self.query(script)
+            self._helpers_loaded = True
+        
+        if self._loaded_cpg != cpg_path:
+            self.query(f"loadCpg({json.dumps(cpg_path)})")
+            self._loaded_cpg = cpg_path
+        
+        return self.query(f"println(neighborhoodsJson({json.dumps(specs_json)}))")
+    
+    def shutdown(self):
+        """Stop the server if this client spawned it."""
+        if self._process is None:
+            return
+        if self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+        self._process = None
+
+
+def _parse_neighborhoods(output: str, count: int) -> List[Dict[str, Any]]:
+    """Extract the {"results": [...]} JSON from Joern output, padded/truncated to count entries."""
+    start_idx = output.find('{')
+    end_idx = output.rfind('}') + 1
+    
+    if start_idx < 0 or end_idx <= start_idx:
+        print(f"Warning: No JSON found in Joern output")
+        return [{} for _ in range(count)]
+    
+    results = json.loads(output[start_idx:end_idx]).get("results", [])
+    if len(results) != count:
+        print(f"Warning: Joern returned {len(results)} neighborhoods for {count} methods")
+    results = results[:count]
+    return results + [{} for _ in range(count - len(results))]
+
+
+def _cpg_version(cpg_path: str) -> Optional[str]:
+    """Identify a CPG build and the query script, so a rebuilt CPG or edited script misses the cache."""
+    try:
+        cpg_stat = Path(cpg_path).stat()
+        script_mtime = GRAPH_NEIGHBORHOOD_SCRIPT.stat().st_mtime_ns
+    except OSError:
+        return None
+    return f"{cpg_stat.st_mtime_ns}:{cpg_stat.st_size}:{script_mtime}"
+
+
+def _open_neighborhood_cache(path: Path) -> sqlite3.Connection:
+    """Open (creating if needed) the SQLite cache of graph neighborhoods."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path))
+    # One row per method of a CPG; a newer cpg_version replaces the row
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS neighborhoods ("
+        "cpg_path TEXT, method_name TEXT, file_path TEXT, cpg_version TEXT, result TEXT, "
+        "PRIMARY KEY (cpg_path, method_name, file_path))"
+    )
+    return conn
+
+
+def get_graph_neighborhoods(
     cpg_path: str,
-    method_name: str,
-    file_path: str = ""
-) -> Dict[str, Any]:
+    method_specs: List[Tuple[str, str]],
+    joern_client: Optional[JoernClient] = None,
+    use_cache: bool = True
+) -> List[Dict[str, Any]]:
     """
-    Query Joern to get graph neighborhood (callers, callees, types) for a method.
+    Query Joern once for the graph neighborhoods (callers, callees, types) of several methods.
+    
+    A single joern invocation loads the CPG and answers every spec, so JVM startup
+    and CPG loading are paid once instead of once per method. With a JoernClient the
+    query goes to a resident server instead, falling back to a one-off joern run on error.
+    Answers are cached on disk per (CPG, method, file), so only new methods reach Joern.
+    
+    Args:
+        cpg_path: Path to CPG file
+        method_specs: (method_name, file_path) pairs; file_path may be empty
+        joern_client: Optional client for a resident Joern server
+        use_cache: Read and write the neighborhood cache (NEIGHBORHOOD_CACHE_PATH)
     
     Returns:
-        Dictionary with callers, callees, types, or empty dict on error
+        One dictionary per spec, in the same order, with callers, callees, types,
+        or an empty dict on error
     """
-    script_path = Path(__file__).parent.parent / "joern_scripts" / "get_graph_neighborhood.sc"
+    if not method_specs:
+        return []
     
-    if not script_path.exists():
-        print(f"Error: Joern script not found at '{script_path}'")
-        return {}
+    if not GRAPH_NEIGHBORHOOD_SCRIPT.exists():
+        print(f"Error: Joern script not found at '{GRAPH_NEIGHBORHOOD_SCRIPT}'")
+        return [{} for _ in method_specs]
+    
+    # Candidates with the same (name, file) under different ids share one lookup
+    unique_specs = list(dict.fromkeys((name, path or "") for name, path in method_specs))
+    
+    by_spec = {}
+    cache = None
+    cpg_key = str(Path(cpg_path).resolve())
+    cpg_version = _cpg_version(cpg_path) if use_cache else None
+    if cpg_version is not None:
+        try:
+            cache = _open_neighborhood_cache(NEIGHBORHOOD_CACHE_PATH)
+            for spec in unique_specs:
+                row = cache.execute(
+                    "SELECT result FROM neighborhoods "
+                    "WHERE cpg_path = ? AND method_name = ? AND file_path = ? AND cpg_version = ?",
+                    (cpg_key, *spec, cpg_version)
+                ).fetchone()
+                if row is not None:
+                    by_spec[spec] = json.loads(row[0])
+        except sqlite3.Error as e:
+            print(f"Warning: Could not use Joern result cache '{NEIGHBORHOOD_CACHE_PATH}': {e}")
+            cache = None
+    
+    missing = [spec for spec in unique_specs if spec not in by_spec]
+    if missing:
+        neighborhoods = _query_neighborhoods(cpg_path, missing, joern_client)
+        by_spec.update(zip(missing, neighborhoods))
+        if cache is not None:
+            # Empty dicts are failed queries and are retried next time
+            rows = [
+                (cpg_key, *spec, cpg_version, json.dumps(result))
+                for spec, result in zip(missing, neighborhoods) if result
+            ]
+            try:
+                with cache:
+                    cache.executemany("INSERT OR REPLACE INTO neighborhoods VALUES (?, ?, ?, ?, ?)", rows)
+            except sqlite3.Error as e:
+                print(f"Warning: Could not update Joern result cache: {e}")
+    if cache is not None:
+        cache.close()
+    
+    return [by_spec[(name, path or "")] for name, path in method_specs]
+
+
+def _query_neighborhoods(
+    cpg_path: str,
+    method_specs: List[Tuple[str, str]],
+    joern_client: Optional[JoernClient]
+) -> List[Dict[str, Any]]:
+    """Run the batch neighborhood query for distinct specs (see get_graph_neighborhoods)."""
+    specs_json = json.dumps([list(spec) for spec in method_specs], ensure_ascii=False)
+    
+    if joern_client is not None:
+        try:
+            output = joern_client.neighborhoods(cpg_path, specs_json)
+            return _parse_neighborhoods(output, len(method_specs))
+        except Exception as e:
+            print(f"Warning: Joern server query failed ({e}). Falling back to a one-off joern run.")
     
     try:
         cmd = [
             "joern",
-            "--script", str(script_path),
+            "--script", str(GRAPH_NEIGHBORHOOD_SCRIPT),
             "--param", f"cpgFile={cpg_path}",
-            "--param", f"methodName={method_name}"
+            "--param", f"methodsJson={specs_json}"
         ]
         
-        if file_path:
-            cmd.extend(["--param", f"filePath={file_path}"])
-        
         result = subprocess.run(
             cmd,
             capture_output=True,
             text=True,
             check=True,
-            timeout=60
+            timeout=60 + 10 * len(method_specs)
         )
         
-        # Extract JSON from output
-        output = result.stdout
-        start_idx = output.find('{')
-        end_idx = output.rfind('}') + 1
-        
-        if start_idx >= 0 and end_idx > start_idx:
-            json_str = output[start_idx:end_idx]
-            return json.loads(json_str)
-        else:
-            print(f"Warning: No JSON found in Joern output")
-            return {}
+        return _parse_neighborhoods(result.stdout, len(method_specs))
             
     except subprocess.CalledProcessError as e:
         print(f"Error running Joern query:")
         if e.stderr:
             print(f"  {e.stderr[:500]}")
-        return {}
+        return [{} for _ in method_specs]
     except json.JSONDecodeError as e:
         print(f"Error parsing JSON from Joern: {e}")
-        return {}
+        return [{} for _ in method_specs]
     except Exception as e:
         print(f"Unexpected error querying graph: {e}")
+        return [{} for _ in method_specs]
+
+
+def get_graph_neighborhood(
+    cpg_path: str,
+    method_name: str,
+    file_path: str = ""
+) -> Dict[str, Any]:
+    """
+    Query Joern to get graph neighborhood (callers, callees, types) for a method.
+    
+    Returns:
+        Dictionary with callers, callees, types, or empty dict on error
+    """
+    return get_graph_neighborhoods(cpg_path, [(method_name, file_path)])[0]
+
+
+@functools.lru_cache(maxsize=4)
+def _read_methods_index(path: str, mtime: float) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """Parse a methods JSON into {(methodName, filePath): method}; cached per file version."""
+    try:
+        methods_json_data = load_json(path)
+    except Exception as e:
+        print(f"Warning: Could not load methods JSON: {e}")
         return {}
+    
+    methods_index = {}
+    for method in methods_json_data.get("methods", []):
+        # First occurrence wins, as with the old linear scan
+        methods_index.setdefault((method.get("methodName"), method.get("filePath")), method)
+    return methods_index
+
+
+def _load_methods_index(project_name: str) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """Index of data/methods_<project>.json, re-read only when the file changes."""
+    methods_json_path = Path("data") / f"methods_{project_name}.json"
+    try:
+        mtime = methods_json_path.stat().st_mtime
+    except OSError:
+        return {}
+    return _read_methods_index(str(methods_json_path.resolve()), mtime)
 
 
 def build_prompt(
@@ -253,49 +900,33 @@ def build_prompt(
     Build a prompt for the LLM with question, code, and graph context.
     Uses a clear, instruction-following format with question-specific guidance.
     """
-    prompt_parts = []
-    
     # Start with the question first so the model knows what to answer
-    prompt_parts.append("You are a code analysis assistant.")
-    prompt_parts.append(f"\nQuestion: {question}")
-    prompt_parts.append("\nBelow is relevant code and relationship information to help answer this question.")
-    prompt_parts.append("\n" + "=" * 80)
-    prompt_parts.append("QUESTION")
-    prompt_parts.append("=" * 80)
-    prompt_parts.append(f"\n{question}\n")
-    
-    # Load methods JSON to get actual source code (not CPG representations)
-    methods_json_data = {}
-    if project_name:
-        methods_json_path = Path("data") / f"methods_{project_name}.json"
-        if methods_json_path.exists():
-            try:
-                with open(methods_json_path, 'r') as f:
-                    methods_json_data = json.load(f)
-            except Exception as e:
-                print(f"Warning: Could not load methods JSON: {e}")
+    prompt_parts = [
+        "You are a code analysis assistant.\n"
+        f"\nQuestion: {question}\n"
+        f"{_PROMPT_QUESTION_HEADER}\n"
+        f"\n{question}\n"
+    ]
+    
+    # Methods JSON indexed by (name, file) to get actual source code (not CPG representations)
+    methods_index = _load_methods_index(project_name) if project_name else {}
     
     # Helper to get actual source code from methods JSON
     def get_actual_source_code(metadata: Dict[str, Any], document: str) -> str:
         """Get actual source code from methods JSON if available, otherwise use document"""
-        if not methods_json_data or "methods" not in methods_json_data:
+        if not methods_index:
             return document
         
-        method_name = metadata.get('method_name', '')
-        file_path = metadata.get('file_path', '')
-        
         # Find matching method in JSON
-        for method in methods_json_data["methods"]:
-            if (method.get("methodName") == method_name and 
-                method.get("filePath") == file_path):
-                # Use actual source code if available
-                code = method.get("code", "")
-                if code and code != "<empty>" and len(code.strip()) > 30:
-                    # Check if it's actual source code (not CPG representation)
-                    # CPG representations often have patterns like tmp\d+, __iter__, etc.
-                    if not re.search(r'tmp\d+|__iter__|__next__|manager_tmp', code):
-                        return code
-                break
+        method = methods_index.get((metadata.get('method_name', ''), metadata.get('file_path', '')))
+        if method is not None:
+            # Use actual source code if available
+            code = method.get("code", "")
+            if code and code != "<empty>" and len(code.strip()) > 30:
+                # Check if it's actual source code (not CPG representation)
+                # CPG representations often have patterns like tmp\d+, __iter__, etc.
+                if not _CPG_ARTIFACT_RE.search(code):
+                    return code
         
         # Fallback to document, but try to extract code from it
         # The document might have "Code:\n..." format
@@ -359,56 +990,38 @@ def build_prompt(
         valid_methods = methods
     
     # Add code sections - methods are already sorted by semantic relevance from ChromaDB
-    prompt_parts.append("=" * 80)
-    prompt_parts.append("RELEVANT CODE METHODS")
-    prompt_parts.append("=" * 80)
-    prompt_parts.append("(Methods are ordered by semantic relevance to your question)")
-    prompt_parts.append("IMPORTANT: Review ALL methods below - even if a method appears later in the list, it may still be highly relevant to your question.")
+    prompt_parts.append(_PROMPT_METHODS_HEADER)
     
     for i, method in enumerate(valid_methods, 1):
         metadata = method.get("metadata", {})
-        file_path = metadata.get('file_path', 'unknown')
-        method_name = metadata.get('method_name', 'unknown')
-        
-        prompt_parts.append(f"\n--- Method {i}: {method_name} ---")
-        prompt_parts.append(f"File: {file_path}")
-        prompt_parts.append(f"Line: {metadata.get('line_number', 'unknown')}")
         
         # Use actual source code from methods JSON instead of CPG document
         actual_code = get_actual_source_code(metadata, method.get('document', ''))
-        prompt_parts.append(f"\nCode:\n{actual_code}")
+        prompt_parts.append(
+            f"\n--- Method {i}: {metadata.get('method_name', 'unknown')} ---\n"
+            f"File: {metadata.get('file_path', 'unknown')}\n"
+            f"Line: {metadata.get('line_number', 'unknown')}\n"
+            f"\nCode:\n{actual_code}"
+        )
     
     # Add graph neighborhood with emphasis on callers for "who calls" questions
-    prompt_parts.append("\n" + "=" * 80)
-    prompt_parts.append("CODE RELATIONSHIPS")
-    prompt_parts.append("=" * 80)
-    prompt_parts.append("IMPORTANT: The relationships below show which methods call the methods above.")
-    prompt_parts.append("Pay special attention to class names and file paths in the 'Called by' section -")
-    prompt_parts.append("they often reveal the main components and algorithms in the codebase.")
-    #prompt_parts.append("For example, if you see 'A2C_ACKTR.update' or 'PPO.update' in the 'Called by' list,")
-   # prompt_parts.append("that means A2C_ACKTR and PPO are algorithms/classes in the codebase.")
-    
-    # Collect all callers for summary - only for valid methods
-    all_callers = []
+    prompt_parts.append(_PROMPT_RELATIONSHIPS_HEADER)
+    
+    # Only for valid methods
     for i, (method, graph) in enumerate(zip(valid_methods, graph_data[:len(valid_methods)]), 1):
         if not graph.get("found", False):
             continue
         
-        method_name = graph.get('methodName', 'unknown')
-        metadata = method.get("metadata", {})
-        file_path = metadata.get('file_path', '')
-        
         # Only show graph data for methods with valid file paths
+        file_path = method.get("metadata", {}).get('file_path', '')
         if not file_path or file_path == "unknown":
             continue
         
-        prompt_parts.append(f"\n--- Method {i}: {method_name} ---")
+        prompt_parts.append(f"\n--- Method {i}: {graph.get('methodName', 'unknown')} ---")
         
         callers = graph.get("callers", [])
         if callers:
             prompt_parts.append(f"Called by: {', '.join(callers[:10])}")
-            for caller in callers[:10]:
-                all_callers.append((method_name, caller))
         
         callees = graph.get("callees", [])
         if callees:
@@ -417,55 +1030,270 @@ def build_prompt(
                 prompt_parts.append(f"Calls: {', '.join(filtered_callees[:10])}")
     
     # Simple, clear instructions - be very explicit
-    prompt_parts.append("\n" + "=" * 80)
-    prompt_parts.append("INSTRUCTIONS")
-    prompt_parts.append("=" * 80)
-    prompt_parts.append("You are a code analysis assistant. Based on the code methods and relationships shown above, answer the following question in natural language.")
-    prompt_parts.append("")
-    prompt_parts.append("IMPORTANT: Write a natural language answer. Do NOT copy or repeat:")
-    prompt_parts.append("- Method names with '--- Method X: name ---' format")
-    prompt_parts.append("- 'Called by:' or 'Calls:' lines")
-    prompt_parts.append("- Code fragments or variable names")
-    prompt_parts.append("")
-    prompt_parts.append("Instead, explain what the functions do in plain English.")
-    prompt_parts.append("\nQuestion: " + question)
-    prompt_parts.append("\nAnswer:")
+    prompt_parts.append(f"{_PROMPT_INSTRUCTIONS}\n\nQuestion: {question}\n\nAnswer:")
     
     return "\n".join(prompt_parts)
 
-#- The user does NOT see the code snippets or context - they only see your answer
-def generate_answer(
-    prompt: str,
-    model_name: str = "Qwen/Qwen2.5-Coder-7B-Instruct",
-    device: str = "cpu",
-    max_length: int = 1024,
-    temperature: float = 0.3
-) -> str:
+QUANTIZATION_MODES = ("none", "4bit", "8bit", "gptq")
+KV_CACHE_BITS = (2, 4)
+
+
+def _llm_dtype(device: str) -> torch.dtype:
+    """bfloat16 on GPUs that support it (Ampere+), float16 on older GPUs, float32 on CPU."""
+    if device != "cuda":
+        return torch.float32
+    return torch.bfloat16 if torch.cuda.is_bf16_supported() else torch.float16
+
+
+def _quantization_config(quantization: str):
     """
-    Generate answer using an open-source LLM.
-    Uses instruction-tuned models with proper chat templates.
+    Build the bitsandbytes config for --quantization 4bit/8bit.
+    
+    Returns:
+        BitsAndBytesConfig, or None for "none" and pre-quantized "gptq" checkpoints
+    """
+    if quantization not in ("4bit", "8bit"):
+        return None
+    
+    from transformers import BitsAndBytesConfig
+    
+    if quantization == "4bit":
+        return BitsAndBytesConfig(
+            load_in_4bit=True,
+            bnb_4bit_quant_type="nf4",
+            bnb_4bit_use_double_quant=True,
+            bnb_4bit_compute_dtype=_llm_dtype("cuda")
+        )
+    return BitsAndBytesConfig(load_in_8bit=True)
+
+
+def _kv_cache_kwargs(kv_cache_bits: Optional[int]) -> Dict[str, Any]:
     """
-    print(f"Loading LLM '{model_name}'...")
+    generate() arguments for a quantized KV cache (optimum-quanto backend).
     
+    Long prompts of retrieved code make the cache, not the weights, the main
+    memory cost; keys and values are stored at kv_cache_bits instead of 16 bits.
+    """
+    if not kv_cache_bits:
+        return {}
     try:
-        tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
-        
-        # Set pad token if not set
-        if tokenizer.pad_token is None:
-            tokenizer.pad_token = tokenizer.eos_token
-        
+        # transformers < 4.56 expects a config object, later versions a dict
+        from transformers import QuantizedCacheConfig
+        cache_config = QuantizedCacheConfig(backend="quanto", nbits=kv_cache_bits)
+    except ImportError:
+        cache_config = {"backend": "quanto", "nbits": kv_cache_bits}
+    return {"cache_implementation": "quantized", "cache_config": cache_config}
+
+
+def _compile_llm(model, device: str):
+    """
+    Graph-compile the LLM for faster decoding; the first generation pays the compile cost.
+    
+    On CPU, Intel Extension for PyTorch is used when installed; otherwise the
+    forward pass goes through torch.compile (CUDA graphs on GPU), which is what
+    generate() calls once per token. generate() then uses a static KV cache:
+    preallocated cache tensors keep shapes fixed, so the graph is not
+    recompiled as the cache grows. A compiled model is therefore not used with
+    a quantized KV cache or an assistant model (main() rules both out).
+    """
+    if device == "cpu":
+        try:
+            import intel_extension_for_pytorch as ipex
+        except ImportError:
+            ipex = None
+        if ipex is not None:
+            return ipex.optimize(model.eval())
+    
+    model.generation_config.cache_implementation = "static"
+    model.forward = torch.compile(
+        model.forward,
+        mode="reduce-overhead" if device == "cuda" else "default",
+        fullgraph=False
+    )
+    return model
+
+
+def _attn_implementation(device: str) -> Optional[str]:
+    """FlashAttention-2 on CUDA when flash-attn is installed, otherwise the transformers default."""
+    if device == "cuda" and importlib.util.find_spec("flash_attn") is not None:
+        return "flash_attention_2"
+    return None
+
+
+@functools.lru_cache(maxsize=2)
+def _get_llm(model_name: str, device: str, quantization: str = "none", compile_model: bool = False):
+    """
+    Load the LLM and its tokenizer once per (model, device, quantization, compile).
+    
+    Args:
+        model_name: HuggingFace model name or path
+        device: "cpu" or "cuda"
+        quantization: One of QUANTIZATION_MODES; "gptq" expects a pre-quantized checkpoint
+        compile_model: Compile the model with _compile_llm (unquantized models only)
+    
+    Returns:
+        Tuple of (tokenizer, model)
+    """
+    print(f"Loading LLM '{model_name}'" + (f" ({quantization})..." if quantization != "none" else "..."))
+    tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
+    
+    # Set pad token if not set
+    if tokenizer.pad_token is None:
+        tokenizer.pad_token = tokenizer.eos_token
+    
+    # With low_cpu_mem_usage the checkpoint is memory-mapped (safetensors, or torch.load
+    # with mmap for .bin files) and each tensor goes straight to the device accelerate
+    # picks for it, so there is no full-size copy of the weights in host memory
+    if quantization == "none":
         model = AutoModelForCausalLM.from_pretrained(
             model_name,
             trust_remote_code=True,
-            torch_dtype=torch.float16 if device == "cuda" else torch.float32,
+            torch_dtype=_llm_dtype(device),
             device_map="auto" if device == "cuda" else None,
-            low_cpu_mem_usage=True
+            low_cpu_mem_usage=True,
+            attn_implementation=_attn_implementation(device)
         )
         
         if device == "cpu":
             model = model.to(device)
-        
-        print("✓ Model loaded")
+    else:
+        # Quantized weights are placed by accelerate and carry their own dtype;
+        # GPTQ checkpoints bring their quantization_config with them
+        model = AutoModelForCausalLM.from_pretrained(
+            model_name,
+            trust_remote_code=True,
+            quantization_config=_quantization_config(quantization),
+            device_map="auto",
+            low_cpu_mem_usage=True,
+            attn_implementation=_attn_implementation(device)
+        )
+    
+    print("✓ Model loaded")
+    
+    if compile_model:
+        if quantization != "none":
+            print("Warning: --compile is not applied to quantized models")
+        else:
+            try:
+                model = _compile_llm(model, device)
+            except Exception as e:
+                print(f"Warning: Could not compile the model ({e}). Running it eagerly.")
+    return tokenizer, model
+
+
+@functools.lru_cache(maxsize=None)
+def _get_assistant_model(model_name: str, device: str):
+    """
+    Load the small draft model used for speculative (assisted) decoding.
+    
+    The draft proposes a few tokens per step and the main model verifies them in one
+    forward pass, so it must share the main model's tokenizer (e.g. a smaller model
+    of the same family).
+    
+    Args:
+        model_name: HuggingFace model name or path
+        device: "cpu" or "cuda"
+    
+    Returns:
+        The loaded model, or None if it could not be loaded
+    """
+    print(f"Loading assistant model '{model_name}'...")
+    try:
+        model = AutoModelForCausalLM.from_pretrained(
+            model_name,
+            trust_remote_code=True,
+            torch_dtype=_llm_dtype(device),
+            device_map=device if device == "cuda" else None,
+            low_cpu_mem_usage=True
+        )
+    except Exception as e:
+        print(f"Warning: Could not load assistant model ({e}). Decoding without it.")
+        return None
+    print("✓ Assistant model loaded")
+    return model
+
+
+def _generate_streaming(model, tokenizer, generation_kwargs: Dict[str, Any]):
+    """
+    Run model.generate on a worker thread and print tokens to stdout as they arrive.
+    
+    Returns:
+        The generate() output, as without streaming
+    """
+    from threading import Thread
+    from transformers import TextIteratorStreamer
+    
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    result = {}
+    
+    def run():
+        try:
+            result["outputs"] = model.generate(**generation_kwargs, streamer=streamer)
+        except Exception as e:
+            result["error"] = e
+            # Unblock the consumer loop below
+            streamer.end()
+    
+    thread = Thread(target=run, daemon=True)
+    thread.start()
+    for text in streamer:
+        print(text, end="", flush=True)
+    thread.join()
+    print()
+    
+    if "error" in result:
+        raise result["error"]
+    return result["outputs"]
+
+
+def _trim_meta_commentary(answer: str) -> str:
+    """
+    Cut meta-commentary ("Please provide...", "I cannot provide...") from an answer.
+    
+    Only the first phrase in _META_PHRASES order that occurs is considered: it is cut
+    off when it sits in the last 30% of the answer, and a short answer that opens
+    with it is dropped entirely.
+    """
+    answer_lower = answer.lower()
+    for phrase in _META_PHRASES:
+        idx = answer_lower.find(phrase)
+        if idx < 0:
+            continue
+        # Only remove if it's in the last 30% of the answer (likely trailing meta-commentary)
+        if idx > len(answer) * 0.7:
+            answer = answer[:idx].strip()
+        # If it's at the start and answer is short, clear it
+        elif idx < 50 and len(answer) < 200:
+            answer = ""
+        break
+    return answer
+
+
+#- The user does NOT see the code snippets or context - they only see your answer
+def generate_answer(
+    prompt: str,
+    model_name: str = "Qwen/Qwen2.5-Coder-7B-Instruct",
+    device: str = "cpu",
+    max_length: int = 1024,
+    temperature: float = 0.3,
+    quantization: str = "none",
+    stream: bool = False,
+    compile_model: bool = False,
+    assistant_model_name: Optional[str] = None,
+    kv_cache_bits: Optional[int] = None
+) -> str:
+    """
+    Generate answer using an open-source LLM.
+    Uses instruction-tuned models with proper chat templates.
+    With stream=True the raw tokens are printed as they are generated; the
+    returned answer is cleaned up once generation is complete.
+    With assistant_model_name set, a small draft model of the same family
+    speeds up decoding through HuggingFace assisted generation.
+    With kv_cache_bits set, the KV cache is quantized to that many bits.
+    """
+    try:
+        tokenizer, model = _get_llm(model_name, device, quantization, compile_model)
+        assistant_model = _get_assistant_model(assistant_model_name, device) if assistant_model_name else None
         
         # Use chat template if available (for instruction models)
         # For Qwen models, the chat template should handle the formatting
@@ -492,22 +1320,29 @@ def generate_answer(
         )
         
         if device == "cuda":
-            inputs = {k: v.to(device) for k, v in inputs.items()}
+            inputs = {k: v.to(model.device) for k, v in inputs.items()}
         
         # Generate
         print("Generating answer...")
         sys.stdout.flush()
-        with torch.no_grad():
-            outputs = model.generate(
-                **inputs,
-                max_new_tokens=max_length,
-                temperature=temperature,
-                do_sample=temperature > 0,
-                top_p=0.95,
-                repetition_penalty=1.1,
-                pad_token_id=tokenizer.pad_token_id,
-                eos_token_id=tokenizer.eos_token_id
-            )
+        generation_kwargs = dict(
+            **inputs,
+            max_new_tokens=max_length,
+            temperature=temperature,
+            do_sample=temperature > 0,
+            top_p=0.95,
+            repetition_penalty=1.1,
+            pad_token_id=tokenizer.pad_token_id,
+            eos_token_id=tokenizer.eos_token_id
+        )
+        if assistant_model is not None:
+            generation_kwargs["assistant_model"] = assistant_model
+        generation_kwargs.update(_kv_cache_kwargs(kv_cache_bits))
+        if stream:
+            outputs = _generate_streaming(model, tokenizer, generation_kwargs)
+        else:
+            with torch.no_grad():
+                outputs = model.generate(**generation_kwargs)
         
         # Decode - only decode the newly generated tokens (not the input)
         input_length = inputs['input_ids'].shape[1]
@@ -525,10 +1360,10 @@ def generate_answer(
             for line in lines:
                 line_stripped = line.strip()
                 # Skip structure lines
-                if re.match(r'^--- Method \d+:', line_stripped) or line_stripped.startswith(("Called by:", "Calls:")):
+                if _METHOD_HEADER_RE.match(line_stripped) or line_stripped.startswith(("Called by:", "Calls:")):
                     continue
                 # Skip lines that are just fragments (very short, no verbs)
-                if len(line_stripped) > 20 and not re.match(r'^[,\s\w]+$', line_stripped):
+                if len(line_stripped) > 20 and not _FRAGMENT_LINE_RE.match(line_stripped):
                     content_lines.append(line)
             if content_lines:
                 answer = '\n'.join(content_lines).strip()
@@ -556,79 +1391,36 @@ def generate_answer(
         if "Your answer:" in answer:
             answer = answer.split("Your answer:")[-1].strip()
         
-        # Remove prompt instruction fragments that might leak into the answer
-        instruction_phrases = [
-            "for example:",
-            "avoid speculation",
-            "only provide information",
-            "based on the data given",
-            "do not make assumptions",
-            "question:",
-            "to answer this question",
-            "i need to identify",
-            "given the current information",
-            "i cannot definitively",
-            "therefore, my answer is:",
-            "to identify the specific",
-            "calls sections",
-            "avoid assumptions",
-            "only include information",
-            "don't guess or assume"
-        ]
-        # Remove lines that start with instruction phrases
+        # Remove prompt instruction fragments that might leak into the answer:
+        # lines that start with instruction phrases
         lines = answer.split('\n')
         filtered_lines = []
         for line in lines:
             line_lower = line.lower().strip()
             # Skip lines that are clearly instruction fragments
-            if any(line_lower.startswith(phrase) or phrase in line_lower[:50] for phrase in instruction_phrases):
+            if _INSTRUCTION_PHRASE_RE.search(line_lower, 0, 50):
                 continue
             # Skip lines that are just numbers or formatting
-            if line_lower.startswith(('1.', '2.', '3.', '4.', '5.', '6.', '7.', '8.', '9.', '**')):
+            if _NUMBERED_LINE_RE.match(line_lower):
                 # Check if it's an instruction (has words like "avoid", "only", "don't")
-                if any(word in line_lower for word in ['avoid', 'only', "don't", 'do not', 'include', 'provide']):
+                if _INSTRUCTION_WORD_RE.search(line_lower):
                     continue
             filtered_lines.append(line)
         answer = '\n'.join(filtered_lines).strip()
         
         # Remove instruction phrases from the beginning of the answer
-        for phrase in instruction_phrases:
-            if answer.lower().startswith(phrase.lower()):
-                answer = answer[len(phrase):].strip()
-                # Remove leading punctuation
-                answer = answer.lstrip('.,:;')
-                break
+        match = _INSTRUCTION_PHRASE_RE.match(answer.lower())
+        if match:
+            answer = answer[match.end():].strip()
+            # Remove leading punctuation
+            answer = answer.lstrip('.,:;')
         
         # Filter out meta-commentary and hallucinations
-        meta_phrases = [
-            "Please provide the most appropriate answer",
-            "Based on the given code and relationships",
-            "I cannot provide",
-            "I don't have enough information",
-            "Please provide",
-            "I need more information",
-            "I would need to see",
-            "Without more context",
-            "USE THE INFORMATION",
-            "Your task is clear",
-            "Please confirm",
-            "before I provide"
-        ]
-        for phrase in meta_phrases:
-            if phrase.lower() in answer.lower():
-                # Remove everything from this phrase onwards, but only if it's near the end
-                idx = answer.lower().find(phrase.lower())
-                # Only remove if it's in the last 30% of the answer (likely trailing meta-commentary)
-                if idx > len(answer) * 0.7:
-                    answer = answer[:idx].strip()
-                # If it's at the start and answer is short, clear it
-                elif idx < 50 and len(answer) < 200:
-                    answer = ""
-                break
+        answer = _trim_meta_commentary(answer)
         
         # Filter out repetitive characters (like ssssss)
         # Remove sequences of 4+ repeated characters (allow some repetition)
-        answer = re.sub(r'(.)\1{3,}', '', answer)
+        answer = _REPEATED_CHAR_RE.sub('', answer)
         # Remove sequences of repeated words (but be more lenient)
         words = answer.split()
         filtered_words = []
@@ -651,24 +1443,24 @@ def generate_answer(
         for line in lines:
             line_lower = line.lower().strip()
             # Skip lines that are just meta-commentary (but only if line is short)
-            if len(line_lower) < 100 and any(phrase in line_lower for phrase in ["please provide the most appropriate", "based on the given code and relationships", "i cannot provide", "i don't have enough"]):
+            if len(line_lower) < 100 and _META_LINE_RE.search(line_lower):
                 continue
             # Skip lines that are just repeated characters (4+ same chars)
             if len(line_lower) > 5 and len(set(line_lower.replace(' ', ''))) <= 1:
                 continue
             # Skip lines that contain prompt structure fragments (generic check)
             # Only skip if it's clearly a structure line (contains method number or is very short)
-            if re.search(r'--- Method \d+:', line) or (len(line.strip()) < 50 and ("Called by" in line or "Calls:" in line)):
+            if _METHOD_HEADER_RE.search(line) or (len(line.strip()) < 50 and ("Called by" in line or "Calls:" in line)):
                 continue
             filtered_lines.append(line)
         answer = '\n'.join(filtered_lines).strip()
         
         # Remove prompt structure fragments that might appear inline (but be careful not to remove too much)
         # Only remove if it's clearly a structure fragment, not if it's part of a sentence
-        answer = re.sub(r'--- Method \d+:.*?---', '', answer)
+        answer = _METHOD_BLOCK_RE.sub('', answer)
         # Only remove "Called by:" or "Calls:" if they appear at the start of a line (structure format)
-        answer = re.sub(r'^Called by:.*$', '', answer, flags=re.MULTILINE)
-        answer = re.sub(r'^Calls:.*$', '', answer, flags=re.MULTILINE)
+        answer = _CALLED_BY_LINE_RE.sub('', answer)
+        answer = _CALLS_LINE_RE.sub('', answer)
         
         # If answer is too short, try extracting from full response
         if len(answer) < 50:
@@ -696,15 +1488,8 @@ def generate_answer(
                     answer = "Unable to generate answer. The model may need more context or the question may be too complex."
             
             # Apply filtering to extracted answer
-            for phrase in meta_phrases:
-                if phrase.lower() in answer.lower():
-                    idx = answer.lower().find(phrase.lower())
-                    if idx > len(answer) * 0.7:
-                        answer = answer[:idx].strip()
-                    elif idx < 50 and len(answer) < 200:
-                        answer = ""
-                    break
-            answer = re.sub(r'(.)\1{3,}', '', answer)
+            answer = _trim_meta_commentary(answer)
+            answer = _REPEATED_CHAR_RE.sub('', answer)
         
         
         # Final check: if answer is mostly repetitive characters, reject it
@@ -715,7 +1500,7 @@ def generate_answer(
         
         # Clean up formatting issues (multiple quoted strings, etc.)
         # Remove excessive quotes and fix formatting
-        answer = re.sub(r'"[^"]*"\s*"[^"]*"', lambda m: m.group(0).replace('" "', ' '), answer)  # Join adjacent quoted strings
+        answer = _ADJACENT_QUOTES_RE.sub(lambda m: m.group(0).replace('" "', ' '), answer)  # Join adjacent quoted strings
         answer = answer.replace('" "', ' ').replace('"', '').strip()  # Remove quote artifacts
         
         # Remove incomplete sentences and fragments
@@ -820,11 +1605,82 @@ def main():
         action="store_true",
         help="Skip LLM reasoning, only show retrieved code and graph data"
     )
+    parser.add_argument(
+        "--retrieval-only",
+        action="store_true",
+        help="Like --no-llm, but print the retrieved methods and graph data to stdout as JSON "
+             "(progress messages go to stderr)"
+    )
+    parser.add_argument(
+        "--no-query-cache",
+        action="store_true",
+        help="Always encode the question instead of reusing its cached embedding"
+    )
+    parser.add_argument(
+        "--embedding-backend",
+        choices=BACKENDS,
+        help="Encoder backend for the question; onnx, onnx-int8 (quantized) and openvino run "
+             "an exported model on CPU (overrides config.yaml, default: torch)"
+    )
+    parser.add_argument(
+        "--index-server",
+        metavar="SOCKET",
+        help="Encode the question on an 'index_methods.py --server' at this UNIX socket, "
+             "which keeps the embedding model loaded (falls back to loading it in-process)"
+    )
+    parser.add_argument(
+        "--ann-profile",
+        choices=list(ANN_PROFILES),
+        help="HNSW search breadth: fast (ef 32), balanced (128, the index default) or recall (256); "
+             "for this run only, needs chromadb>=1.0"
+    )
+    parser.add_argument(
+        "--no-joern-cache",
+        action="store_true",
+        help="Always query Joern instead of reusing cached graph neighborhoods (.joern_cache/)"
+    )
     parser.add_argument(
         "--device",
         choices=["cpu", "cuda"],
         help="Device to use for models (overrides config.yaml)"
     )
+    parser.add_argument(
+        "--quantization",
+        choices=QUANTIZATION_MODES,
+        help="Load the LLM with 4-bit/8-bit bitsandbytes weights or from a GPTQ checkpoint "
+             "(CUDA only; overrides config.yaml, default: none)"
+    )
+    parser.add_argument(
+        "--kv-cache-bits",
+        type=int,
+        choices=KV_CACHE_BITS,
+        help="Quantize the LLM's KV cache to this many bits to fit long prompts "
+             "(needs optimum-quanto; overrides config.yaml)"
+    )
+    parser.add_argument(
+        "--joern-server",
+        nargs="?",
+        const="127.0.0.1:8080",
+        metavar="HOST:PORT",
+        help="Run graph queries on a resident 'joern --server' (default 127.0.0.1:8080); "
+             "reuses a server already listening there, otherwise starts one for this run"
+    )
+    parser.add_argument(
+        "--compile",
+        action="store_true",
+        help="Compile the LLM (torch.compile, or IPEX on CPU when installed); "
+             "slower first answer, faster decoding when a process answers several questions"
+    )
+    parser.add_argument(
+        "--assistant-model",
+        help="Small draft LLM sharing the main model's tokenizer for speculative decoding, "
+             "e.g. Qwen/Qwen2.5-Coder-0.5B-Instruct (overrides config.yaml)"
+    )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Print the LLM's raw output token by token while it is generated"
+    )
     parser.add_argument(
         "--dump-prompt",
         help="Save the final prompt to a text file"
@@ -832,6 +1688,12 @@ def main():
     
     args = parser.parse_args()
     
+    # Keep stdout clean for the JSON result
+    json_out = None
+    if args.retrieval_only:
+        args.no_llm = True
+        json_out, sys.stdout = sys.stdout, sys.stderr
+    
     # Load config
     config = load_config()
     embedding_config = config.get("embedding", {})
@@ -847,10 +1709,33 @@ def main():
         print("Warning: CUDA requested but not available. Falling back to CPU.")
         device = "cpu"
     
+    quantization = args.quantization or llm_config.get("quantization", "none")
+    if quantization != "none" and device != "cuda":
+        print(f"Warning: --quantization {quantization} needs CUDA. Loading the LLM unquantized.")
+        quantization = "none"
+    
+    kv_cache_bits = args.kv_cache_bits or llm_config.get("kv_cache_bits")
+    if kv_cache_bits:
+        try:
+            import optimum.quanto
+        except ImportError:
+            print("Warning: --kv-cache-bits needs optimum-quanto. Using a full-precision KV cache.")
+            kv_cache_bits = None
+    
+    # The compiled forward relies on the static KV cache, which neither the quantized
+    # cache nor assisted decoding can use
+    compile_model = args.compile
+    assistant_model_name = args.assistant_model or llm_config.get("assistant_model_name")
+    if compile_model and (kv_cache_bits or assistant_model_name):
+        conflict = "--kv-cache-bits" if kv_cache_bits else "--assistant-model"
+        print(f"Warning: --compile cannot be combined with {conflict}. Running the LLM eagerly.")
+        compile_model = False
+    
     # Get embedding device (can be overridden by --device flag)
     embedding_device = args.device or embedding_config.get("device", "cpu")
     if embedding_device == "cuda" and not torch.cuda.is_available():
         embedding_device = "cpu"
+    embedding_backend = resolve_backend(args.embedding_backend or embedding_config.get("backend", "torch"))
     
     print("=" * 80)
     print("GraphRAG Code Analysis Query")
@@ -869,15 +1754,29 @@ def main():
     print("Step 1: Semantic retrieval from ChromaDB...")
     print(f"  Using device: {embedding_device} for embeddings")
     sys.stdout.flush()
-    embedding_model = SentenceTransformer(embedding_model_name, device=embedding_device)
-    
-    methods = retrieve_methods(
-        args.question,
-        args.project_name,
-        embedding_model,
-        args.chromadb_dir,
-        args.top_k
-    )
+    previous_ef_search = None
+    if args.ann_profile:
+        previous_ef_search = apply_ann_profile(args.chromadb_dir, args.project_name, args.ann_profile)
+        if previous_ef_search is not None:
+            print(f"  ANN profile: {args.ann_profile} (ef_search={ANN_PROFILES[args.ann_profile]})")
+    try:
+        # The embedding model is only loaded if the question is not in the query cache
+        methods = retrieve_methods(
+            args.question,
+            args.project_name,
+            None,
+            args.chromadb_dir,
+            args.top_k,
+            embedding_model_name=embedding_model_name,
+            embedding_device=embedding_device,
+            use_query_cache=not args.no_query_cache,
+            embedding_server=args.index_server,
+            embedding_backend=embedding_backend
+        )
+    finally:
+        # The profile only applies to this run
+        if previous_ef_search is not None:
+            restore_ef_search(args.chromadb_dir, args.project_name, previous_ef_search)
     
     if not methods:
         print("Error: No methods retrieved. Please check project name and ensure indexing is complete.")
@@ -900,13 +1799,17 @@ def main():
             print(f"Warning: CPG file '{args.cpg_path}' not found. Skipping graph expansion.")
             sys.stdout.flush()
         else:
-            for method in methods:
-                metadata = method.get("metadata", {})
-                method_name = metadata.get("method_name", "")
-                file_path = metadata.get("file_path", "")
-                
-                graph = get_graph_neighborhood(str(cpg_path), method_name, file_path)
-                graph_data.append(graph)
+            method_specs = [
+                (method.get("metadata", {}).get("method_name", ""), method.get("metadata", {}).get("file_path", ""))
+                for method in methods
+            ]
+            joern_client = None
+            if args.joern_server:
+                host, _, port = args.joern_server.rpartition(":")
+                joern_client = JoernClient(host or "127.0.0.1", int(port))
+            graph_data = get_graph_neighborhoods(
+                str(cpg_path), method_specs, joern_client, use_cache=not args.no_joern_cache
+            )
             
             print(f"✓ Retrieved graph data for {len(graph_data)} methods")
             sys.stdout.flush()
@@ -935,7 +1838,12 @@ def main():
             model_name=llm_model_name,
             device=device,
             max_length=llm_config.get("max_length", 1024),  # Reduced for better quality
-            temperature=llm_config.get("temperature", 0.3)  # Lower temperature for more focused answers
+            temperature=llm_config.get("temperature", 0.3),  # Lower temperature for more focused answers
+            quantization=quantization,
+            stream=args.stream,
+            compile_model=compile_model,
+            assistant_model_name=assistant_model_name,
+            kv_cache_bits=kv_cache_bits
         )
         
         print("\n" + "=" * 80)
@@ -943,6 +1851,11 @@ def main():
         print("=" * 80)
         print(answer)
         sys.stdout.flush()
+    elif json_out is not None:
+        print("\nStep 3: Skipped (--retrieval-only flag)")
+        sys.stdout.flush()
+        json.dump({"question": args.question, "methods": methods, "graph": graph_data}, json_out, indent=2)
+        json_out.write("\n")
     else:
         print("\nStep 3: Skipped (--no-llm flag)")
         print("\nRetrieved methods and graph data:")
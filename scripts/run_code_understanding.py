@@ -4,11 +4,12 @@ Wrapper script to run code understanding on CPG nodes JSON
 """
 
 import argparse
-import json
 import sys
 from pathlib import Path
 from collections import defaultdict
 
+from cpg_json import load_filtered_array
+
 # Add cpg_rag_complete to path
 sys.path.insert(0, str(Path(__file__).parent.parent / "cpg_rag_complete"))
 
@@ -47,68 +48,56 @@ def main():
         print(f"Please extract CPG nodes first using: python scripts/extract_cpg_json.py <cpg.bin>")
         sys.exit(1)
     
-    with open(nodes_path, 'r') as f:
-        nodes = json.load(f)
-    
-    if not isinstance(nodes, list):
+    # Only METHOD nodes are analyzed, so the rest are dropped while parsing
+    loaded = load_filtered_array(nodes_path, '_label', 'METHOD')
+    if loaded is None:
         print(f"Error: Expected list of nodes in {nodes_path}")
         sys.exit(1)
+    methods, node_count = loaded
     
     # Load edges for graph context (optional)
     edges = []
     edges_path = Path(args.edges_json)
     if edges_path.exists():
-        with open(edges_path, 'r') as f:
-            edges = json.load(f)
-        print(f"Loaded {len(edges)} edges from {edges_path}")
+        # Only CALL edges are used
+        edges, edge_count = load_filtered_array(edges_path, 'label', 'CALL') or ([], 0)
+        print(f"Loaded {edge_count} edges from {edges_path}")
     
-    print(f"Loaded {len(nodes)} nodes from {nodes_path}")
+    print(f"Loaded {node_count} nodes from {nodes_path}")
     
     # Initialize understander
     understander = CodeUnderstander(CONFIG)
     
-    # Build node ID to node mapping
-    node_map = {node.get('id'): node for node in nodes if node.get('_label') == 'METHOD'}
+    # One pass over the methods builds the ID to name mapping, the source files
+    # dict and the methods in the format expected by the understander
+    # (name, filename, lineNumber, called_by); each called_by list is the
+    # method's callers_map entry, filled from the edges afterwards
+    node_names = {}
+    callers_map = defaultdict(list)
+    source_files = {}
+    formatted_methods = []
+    for node in methods:
+        node_id = node.get('id')
+        node_names[node_id] = node.get('name', '')
+        filename = node.get('filename', 'unknown')
+        # Skip empty or placeholder filenames (operator methods, built-ins) for better analysis
+        if filename and filename.strip() not in ['', '<empty>', 'unknown']:
+            if filename not in source_files:
+                # Use code as file content (simplified)
+                source_files[filename] = node.get('code', '')
+            formatted_methods.append({
+                'name': node.get('name', 'unknown'),
+                'filename': filename,
+                'lineNumber': node.get('lineNumber', 0),
+                'called_by': callers_map[node_id]
+            })
     
     # Build callers map from edges
-    callers_map = {}
     for edge in edges:
-        if edge.get('label') == 'CALL':
-            src = edge.get('src')
-            dst = edge.get('dst')
-            if src in node_map and dst in node_map:
-                if dst not in callers_map:
-                    callers_map[dst] = []
-                callers_map[dst].append(node_map[src].get('name', ''))
-    
-    # Build source files dict from nodes (only real files, not empty)
-    source_files = {}
-    for node in nodes:
-        if node.get('_label') == 'METHOD':
-            filename = node.get('filename', 'unknown')
-            # Skip empty or placeholder filenames
-            if filename and filename.strip() not in ['', '<empty>', 'unknown']:
-                if filename not in source_files:
-                    # Use code as file content (simplified)
-                    source_files[filename] = node.get('code', '')
-    
-    # Convert nodes to format expected by understander
-    # The understander expects methods with 'name', 'filename', 'lineNumber', 'called_by'
-    # Filter out methods with empty filenames (operator methods, built-ins)
-    formatted_methods = []
-    for node in nodes:
-        if node.get('_label') == 'METHOD':
-            filename = node.get('filename', 'unknown')
-            # Skip methods with empty filenames for better analysis
-            if filename and filename.strip() not in ['', '<empty>', 'unknown']:
-                node_id = node.get('id')
-                formatted_method = {
-                    'name': node.get('name', 'unknown'),
-                    'filename': filename,
-                    'lineNumber': node.get('lineNumber', 0),
-                    'called_by': callers_map.get(node_id, [])
-                }
-                formatted_methods.append(formatted_method)
+        src = edge.get('src')
+        dst = edge.get('dst')
+        if src in node_names and dst in node_names:
+            callers_map[dst].append(node_names[src])
     
     # Analyze structure
     structure = understander.analyze_codebase_structure(formatted_methods, source_files)
@@ -4,16 +4,94 @@ Wrapper script to run fault detection on methods JSON from existing system
 """
 
 import argparse
-import json
+import os
+import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+from cpg_json import flat_record, load_filtered_array, write_ndjson, write_table
+
 # Add cpg_rag_complete to path
 sys.path.insert(0, str(Path(__file__).parent.parent / "cpg_rag_complete"))
 
 from config import CONFIG
 from analyzers.fault_detector import FaultDetector
 
+# CPG internal representations: code that starts with <empty> and contains CPG patterns
+_CPG_PLACEHOLDER_RE = re.compile(r'<empty>.*?(?:tmp|__iter__|RET)', re.DOTALL)
+
+# Detector of this process, set up by _init_worker
+_WORKER_DETECTOR = None
+
+
+def _init_worker():
+    """Create one FaultDetector per process instead of pickling it with every task."""
+    global _WORKER_DETECTOR
+    _WORKER_DETECTOR = FaultDetector(CONFIG)
+
+
+def _analyze_method(node):
+    """
+    Analyze one METHOD node.
+    
+    Returns:
+        The finding (with methodName) if the method has issues, otherwise None
+    """
+    code = node.get('code', '')
+    filename = node.get('filename', 'unknown')
+    method_name = node.get('name', 'unknown')
+    
+    # Skip nodes with empty or placeholder code
+    if not code or code.strip() in ['', '<empty>']:
+        return None
+    
+    # Skip CPG internal representations
+    if _CPG_PLACEHOLDER_RE.match(code):
+        return None
+    
+    # Skip if filename is empty or invalid
+    if not filename or filename.strip() == '':
+        return None
+    
+    # Analyze code
+    finding = _WORKER_DETECTOR.analyze_code(code, filename, node.get('lineNumber', 0))
+    
+    # Only include if there are issues
+    if finding.get('issues'):
+        finding['methodName'] = method_name
+        return finding
+    return None
+
+
+def _iter_findings(methods, workers):
+    """Yield _analyze_method's result for every method, in order, using `workers` processes."""
+    if workers == 1:
+        _init_worker()
+        yield from map(_analyze_method, methods)
+        return
+    chunksize = max(1, len(methods) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        yield from executor.map(_analyze_method, methods, chunksize=chunksize)
+
+
+def _issue_rows(findings):
+    """
+    Flatten findings into one row per issue for the csv/parquet formats.
+    
+    Each row holds the method name, the finding's scalar fields and the issue's own
+    fields (or the issue itself as 'issue' when it is not a dict); nested values are
+    written as JSON.
+    """
+    for finding in findings:
+        context = {'methodName': finding.get('methodName', 'unknown')}
+        context.update(flat_record({
+            key: value for key, value in finding.items()
+            if key not in ('issues', 'security_issues') and not isinstance(value, (list, dict))
+        }))
+        for issue in finding.get('issues', []):
+            yield {**context, **(flat_record(issue) if isinstance(issue, dict) else {'issue': str(issue)})}
+
 
 def main():
     parser = argparse.ArgumentParser(description='Run fault detection on CPG nodes JSON')
@@ -25,10 +103,24 @@ def main():
     parser.add_argument('--all', action='store_true', help='Analyze all issues')
     parser.add_argument('--security', action='store_true', help='Security issues only')
     parser.add_argument('--export', help='Export report to file')
-    parser.add_argument('--format', choices=['console', 'json', 'markdown', 'html'],
-                       default='console', help='Output format')
+    parser.add_argument('--format', choices=['console', 'json', 'markdown', 'html', 'csv', 'parquet'],
+                       default='console',
+                       help='Output format (csv/parquet: one row per issue, written to --export '
+                            'or fault_report.<format>)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                       help='Processes analyzing methods in parallel (default: CPU count, 1 = in-process)')
+    parser.add_argument('--stream', action='store_true',
+                       help='Write each finding as a JSON line (to --export or stdout) as soon as it is '
+                            'found, instead of building a report')
     
     args = parser.parse_args()
+    if args.stream and args.format != 'console':
+        parser.error('--stream writes JSON lines and cannot be combined with --format')
+    
+    # Findings streamed to stdout get it to themselves; messages go to stderr
+    stream_out = None
+    if args.stream and not args.export:
+        stream_out, sys.stdout = sys.stdout.buffer, sys.stderr
     
     # Load CPG nodes JSON
     nodes_path = Path(args.nodes_json)
@@ -37,65 +129,59 @@ def main():
         print(f"Please extract CPG nodes first using: python scripts/extract_cpg_json.py <cpg.bin>")
         sys.exit(1)
     
-    with open(nodes_path, 'r') as f:
-        nodes = json.load(f)
-    
-    if not isinstance(nodes, list):
+    # Only METHOD nodes are analyzed, so the rest are dropped while parsing
+    loaded = load_filtered_array(nodes_path, '_label', 'METHOD')
+    if loaded is None:
         print(f"Error: Expected list of nodes in {nodes_path}")
         sys.exit(1)
+    methods, node_count = loaded
     
-    print(f"Loaded {len(nodes)} nodes from {nodes_path}")
+    print(f"Loaded {node_count} nodes from {nodes_path}")
     
-    # Initialize detector
-    detector = FaultDetector(CONFIG)
-    findings = []
-    
-    # Analyze each node (method)
-    for node in nodes:
-        # CPG nodes have: id, _label, name, signature, fullName, filename, lineNumber, code
-        if node.get('_label') != 'METHOD':
-            continue
-        
-        code = node.get('code', '')
-        filename = node.get('filename', 'unknown')
-        method_name = node.get('name', 'unknown')
-        
-        # Skip nodes with empty or placeholder code
-        if not code or code.strip() in ['', '<empty>']:
-            continue
-        
-        # Skip CPG internal representations (code that starts with <empty> and contains CPG patterns)
-        if code.startswith('<empty>') and ('tmp' in code or '__iter__' in code or 'RET' in code):
-            continue
-        
-        # Skip if filename is empty or invalid
-        if not filename or filename.strip() == '':
-            continue
-        
-        # Analyze code
-        finding = detector.analyze_code(code, filename, node.get('lineNumber', 0))
-        
-        # Only include if there are issues
-        if finding.get('issues'):
-            finding['methodName'] = method_name
-            findings.append(finding)
+    # Methods are independent, so they are analyzed in parallel; map keeps their order
+    workers = max(1, min(args.workers, len(methods)))
+    findings = (finding for finding in _iter_findings(methods, workers) if finding)
     
     # Filter by security if requested
     if args.security:
-        findings = [f for f in findings if f.get('security_issues')]
-    
-    # Generate report
-    report = detector.generate_report(findings, format=args.format)
-    
-    if args.export:
-        with open(args.export, 'w') as f:
-            f.write(report)
-        print(f"\n✅ Report exported to {args.export}")
-    elif args.format == 'console':
-        # Already printed by generate_report
-        pass
+        findings = (f for f in findings if f.get('security_issues'))
+    
+    if args.stream:
+        # Nothing is kept in memory; the summary comes from running counts
+        total_issues = 0
+        method_count = 0
+        for finding in write_ndjson(findings, args.export, stream_out):
+            total_issues += len(finding.get('issues', []))
+            method_count += 1
+        if args.export:
+            print(f"\n✅ Findings exported to {args.export}")
+        print(f"\n📊 Summary: Found {total_issues} issues across {method_count} methods")
+        return
+    
+    findings = list(findings)
+    
+    if args.format in ('csv', 'parquet'):
+        # Tabular formats are written as a table of issues instead of a rendered report
+        export_path = args.export or f'fault_report.{args.format}'
+        if not write_table(list(_issue_rows(findings)), export_path, args.format):
+            sys.exit(1)
+        print(f"\n✅ Report exported to {export_path}")
     else:
-        print(report)
+        # Initialize detector (used for the report)
+        detector = FaultDetector(CONFIG)
+        
+        # Generate report
+        report = detector.generate_report(findings, format=args.format)
+        
+        if args.export:
+            with open(args.export, 'w') as f:
+                f.write(report)
+            print(f"\n✅ Report exported to {args.export}")
+        elif args.format == 'console':
+            # Already printed by generate_report
+            pass
+        else:
+            print(report)
     
     # Print summary
     total_issues = sum(len(f.get('issues', [])) for f in findings)
@@ -4,11 +4,28 @@ Wrapper script to run RAG-based analysis using cpg_rag_complete/step4_query_rag.
 """
 
 import argparse
-import sys
+import ast
+import os
 import subprocess
+import sys
+import warnings
 from pathlib import Path
 
 
+def _defines_main(script_path):
+    """Whether the script defines a top-level main() that takes no required arguments."""
+    try:
+        tree = ast.parse(script_path.read_text(encoding='utf-8'))
+    except (OSError, SyntaxError, ValueError):
+        return False
+    return any(
+        isinstance(node, ast.FunctionDef) and node.name == 'main'
+        and len(node.args.args) == len(node.args.defaults) and not node.args.posonlyargs
+        and all(default is not None for default in node.args.kw_defaults)
+        for node in tree.body
+    )
+
+
 def main():
     parser = argparse.ArgumentParser(description='Run RAG-based code analysis')
     parser.add_argument(
@@ -69,7 +86,7 @@ def main():
             else:
                 query = "What is the overview of this codebase?"
     
-    # Build command - determine query type
+    # Determine query type
     if args.analysis_type == 'fault':
         query_type = 'fault'
     elif args.analysis_type == 'sensitive':
@@ -77,37 +94,50 @@ def main():
     else:  # understanding
         query_type = 'auto'  # Let it auto-detect based on query
     
-    # Set environment variable to suppress warnings - more aggressive
-    import os
-    env = os.environ.copy()
-    env['PYTHONWARNINGS'] = 'ignore::DeprecationWarning:langchain'
-    # Also set for stderr redirection
-    import sys
-    if hasattr(sys, '_getframe'):
-        # Redirect stderr temporarily if needed
-        pass
-    
-    cmd = [
-        sys.executable,
+    argv = [
         str(script_path),
         '--query', query,
         '--type', query_type
     ]
     
     if args.export:
-        cmd.extend(['--export', args.export])
+        argv.extend(['--export', args.export])
     
-    # Run the command with environment variable to suppress warnings
-    result = subprocess.run(cmd, capture_output=True, text=True, env=env)
+    # Suppress langchain deprecation warnings raised while step4_query_rag imports
+    warnings.filterwarnings('ignore', category=DeprecationWarning, module='langchain')
     
-    # Print output
-    if result.stdout:
-        print(result.stdout)
-    if result.stderr:
-        print(result.stderr, file=sys.stderr)
+    # Run step4_query_rag in this process when it defines main(): no second
+    # interpreter start-up, and its output reaches the caller as it is printed.
+    # The script is only imported then, since importing a script without main()
+    # would run it with this wrapper's arguments
+    step4_query_rag = None
+    if _defines_main(script_path):
+        sys.path.insert(0, str(script_path.parent))
+        import step4_query_rag
     
-    sys.exit(result.returncode)
-
+    if callable(getattr(step4_query_rag, 'main', None)):
+        # step4_query_rag.main() parses sys.argv itself
+        saved_argv = sys.argv
+        sys.argv = argv
+        try:
+            step4_query_rag.main()
+        finally:
+            sys.argv = saved_argv
+        return
+    
+    # Otherwise run it as a script, forwarding its output line by line
+    env = os.environ.copy()
+    env['PYTHONWARNINGS'] = 'ignore::DeprecationWarning:langchain'
+    process = subprocess.Popen(
+        [sys.executable] + argv,
+        stdout=subprocess.PIPE,
+        text=True,
+        bufsize=1,
+        env=env
+    )
+    for line in process.stdout:
+        print(line, end='', flush=True)
+    sys.exit(process.wait())
 
 if __name__ == '__main__':
     main()
@@ -4,10 +4,16 @@ Wrapper script to run sensitive data tracking on CPG nodes JSON
 """
 
 import argparse
-import json
+import os
 import sys
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
+import numpy as np
+
+from cpg_json import flat_record, load_filtered_array, write_ndjson, write_table
+
 # Add cpg_rag_complete to path
 sys.path.insert(0, str(Path(__file__).parent.parent / "cpg_rag_complete"))
 
@@ -22,6 +28,123 @@ except ImportError:
         sys.exit(1)
 from analyzers.sensitive_data_tracker import SensitiveDataTracker
 
+# Tracker and --track filter of this process, set up by _init_worker
+_WORKER_TRACKER = None
+_WORKER_TRACK = None
+
+
+def _init_worker(track=None):
+    """Create one SensitiveDataTracker per process instead of pickling it with every task."""
+    global _WORKER_TRACKER, _WORKER_TRACK
+    _WORKER_TRACKER = SensitiveDataTracker(CONFIG)
+    _WORKER_TRACK = track
+
+
+def _analyze_method(task):
+    """
+    Analyze one METHOD node given as a (node, graph_context) pair.
+    
+    Returns:
+        The analysis if it matches --track and has sensitive data or violations, otherwise None
+    """
+    node, graph_context = task
+    code = node.get('code', '')
+    filename = node.get('filename', 'unknown')
+    method_name = node.get('name', 'unknown')
+    
+    if not code:
+        return None
+    
+    # Analyze function
+    analysis = _WORKER_TRACKER.analyze_function(
+        method_name,
+        code,
+        filename,
+        graph_context
+    )
+    
+    # Filter by track type if specified
+    if _WORKER_TRACK:
+        # Check if this analysis has the requested data type
+        has_type = any(
+            flow.get('type') == _WORKER_TRACK 
+            for flow in analysis.get('data_flows', [])
+        )
+        if not has_type:
+            return None
+    
+    # Only include if there's sensitive data or violations
+    if analysis.get('has_sensitive_data') or analysis.get('violations'):
+        return analysis
+    return None
+
+
+def _iter_analyses(tasks, workers, track):
+    """Yield _analyze_method's result for every task, in order, using `workers` processes."""
+    if workers == 1:
+        _init_worker(track)
+        yield from map(_analyze_method, tasks)
+        return
+    chunksize = max(1, len(tasks) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(track,)) as executor:
+        yield from executor.map(_analyze_method, tasks, chunksize=chunksize)
+
+
+def _build_call_maps(methods, edges):
+    """
+    Build the callers/callees maps (method id -> list of caller/callee names) from CALL edges.
+    
+    Method ids are sorted once and every edge endpoint is matched with np.searchsorted,
+    so the join runs in numpy rather than as two dict lookups per edge. That path is
+    only taken when every id is a plain int (numpy would coerce numeric strings and
+    truncate floats); other ids are joined with a dict.
+    
+    Returns:
+        Tuple of (callers_map, callees_map)
+    """
+    callers_map = defaultdict(list)
+    callees_map = defaultdict(list)
+    if not methods or not edges:
+        return callers_map, callees_map
+    
+    node_ids = [node.get('id') for node in methods]
+    src_ids = [edge.get('src') for edge in edges]
+    dst_ids = [edge.get('dst') for edge in edges]
+    use_numpy = all(type(v) is int for ids in (node_ids, src_ids, dst_ids) for v in ids)
+    if use_numpy:
+        try:
+            ids = np.array(node_ids, dtype=np.int64)
+            src = np.array(src_ids, dtype=np.int64)
+            dst = np.array(dst_ids, dtype=np.int64)
+        except OverflowError:
+            use_numpy = False
+    
+    if not use_numpy:
+        node_names = {node_id: node.get('name', '') for node_id, node in zip(node_ids, methods)}
+        for src, dst in zip(src_ids, dst_ids):
+            if src in node_names and dst in node_names:
+                callers_map[dst].append(node_names[src])
+                callees_map[src].append(node_names[dst])
+        return callers_map, callees_map
+    
+    names = np.array([node.get('name', '') for node in methods], dtype=object)
+    order = np.argsort(ids, kind='stable')
+    ids = ids[order]
+    names = names[order]
+    
+    # Last match of each endpoint, so a repeated id resolves to its last name as with a dict
+    src_idx = np.searchsorted(ids, src, side='right') - 1
+    dst_idx = np.searchsorted(ids, dst, side='right') - 1
+    valid = (src_idx >= 0) & (dst_idx >= 0) & (ids[src_idx] == src) & (ids[dst_idx] == dst)
+    
+    for src_id, dst_id, src_name, dst_name in zip(src[valid].tolist(), dst[valid].tolist(),
+                                                  names[src_idx[valid]].tolist(),
+                                                  names[dst_idx[valid]].tolist()):
+        callers_map[dst_id].append(src_name)
+        callees_map[src_id].append(dst_name)
+    return callers_map, callees_map
+
 
 def main():
     parser = argparse.ArgumentParser(description='Run sensitive data tracking on CPG nodes JSON')
@@ -38,10 +161,24 @@ def main():
     parser.add_argument('--track', help='Track specific data type (e.g., password)')
     parser.add_argument('--all', action='store_true', help='Track all sensitive data')
     parser.add_argument('--export', help='Export report to file')
-    parser.add_argument('--format', choices=['console', 'json', 'markdown', 'html'],
-                       default='console', help='Output format')
+    parser.add_argument('--format', choices=['console', 'json', 'markdown', 'html', 'csv', 'parquet'],
+                       default='console',
+                       help='Output format (csv/parquet: one row per function, nested fields as JSON, '
+                            'written to --export or sensitive_data_report.<format>)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                       help='Processes analyzing methods in parallel (default: CPU count, 1 = in-process)')
+    parser.add_argument('--stream', action='store_true',
+                       help='Write each analysis as a JSON line (to --export or stdout) as soon as it is '
+                            'done, instead of building a report')
     
     args = parser.parse_args()
+    if args.stream and args.format != 'console':
+        parser.error('--stream writes JSON lines and cannot be combined with --format')
+    
+    # Analyses streamed to stdout get it to themselves; messages go to stderr
+    stream_out = None
+    if args.stream and not args.export:
+        stream_out, sys.stdout = sys.stdout.buffer, sys.stderr
     
     # Load CPG nodes JSON
     nodes_path = Path(args.nodes_json)
@@ -50,100 +187,78 @@ def main():
         print(f"Please extract CPG nodes first using: python scripts/extract_cpg_json.py <cpg.bin>")
         sys.exit(1)
     
-    with open(nodes_path, 'r') as f:
-        nodes = json.load(f)
-    
-    if not isinstance(nodes, list):
+    # Only METHOD nodes are analyzed, so the rest are dropped while parsing
+    loaded = load_filtered_array(nodes_path, '_label', 'METHOD')
+    if loaded is None:
         print(f"Error: Expected list of nodes in {nodes_path}")
         sys.exit(1)
+    methods, node_count = loaded
     
     # Load edges for graph context (optional)
     edges = []
     edges_path = Path(args.edges_json)
     if edges_path.exists():
-        with open(edges_path, 'r') as f:
-            edges = json.load(f)
-        print(f"Loaded {len(edges)} edges from {edges_path}")
-    
-    print(f"Loaded {len(nodes)} nodes from {nodes_path}")
+        # Only CALL edges are used
+        edges, edge_count = load_filtered_array(edges_path, 'label', 'CALL') or ([], 0)
+        print(f"Loaded {edge_count} edges from {edges_path}")
     
-    # Initialize tracker
-    tracker = SensitiveDataTracker(CONFIG)
-    analyses = []
-    
-    # Build node ID to node mapping for graph context
-    node_map = {node.get('id'): node for node in nodes if node.get('_label') == 'METHOD'}
+    print(f"Loaded {node_count} nodes from {nodes_path}")
     
     # Build call graph from edges
-    callers_map = {}
-    callees_map = {}
-    for edge in edges:
-        if edge.get('label') == 'CALL':
-            src = edge.get('src')
-            dst = edge.get('dst')
-            if src in node_map and dst in node_map:
-                if dst not in callers_map:
-                    callers_map[dst] = []
-                callers_map[dst].append(node_map[src].get('name', ''))
-                if src not in callees_map:
-                    callees_map[src] = []
-                callees_map[src].append(node_map[dst].get('name', ''))
-    
-    # Analyze each node (method)
-    for node in nodes:
-        # CPG nodes have: id, _label, name, signature, fullName, filename, lineNumber, code
-        if node.get('_label') != 'METHOD':
-            continue
-        
-        code = node.get('code', '')
-        filename = node.get('filename', 'unknown')
-        method_name = node.get('name', 'unknown')
-        node_id = node.get('id')
-        
-        if not code:
-            continue
-        
+    callers_map, callees_map = _build_call_maps(methods, edges)
+    
+    # CPG nodes have: id, _label, name, signature, fullName, filename, lineNumber, code
+    tasks = []
+    for node in methods:
         # Get graph context from edges
+        node_id = node.get('id')
         graph_context = {}
         if node_id in callers_map:
             graph_context['callers'] = callers_map[node_id]
         if node_id in callees_map:
             graph_context['callees'] = callees_map[node_id]
+        tasks.append((node, graph_context))
+    
+    # Methods are independent, so they are analyzed in parallel; map keeps their order
+    workers = max(1, min(args.workers, len(tasks)))
+    analyses = (analysis for analysis in _iter_analyses(tasks, workers, args.track) if analysis)
+    
+    if args.stream:
+        # Nothing is kept in memory; the summary comes from running counts
+        total_violations = 0
+        functions_with_sensitive = 0
+        for analysis in write_ndjson(analyses, args.export, stream_out):
+            total_violations += len(analysis.get('violations', []))
+            functions_with_sensitive += bool(analysis.get('has_sensitive_data'))
+        if args.export:
+            print(f"\n✅ Analyses exported to {args.export}")
+        print(f"\n📊 Summary: Found {total_violations} violations across {functions_with_sensitive} functions with sensitive data")
+        return
+    
+    analyses = list(analyses)
+    
+    if args.format in ('csv', 'parquet'):
+        # Tabular formats are written as a table of analyses instead of a rendered report
+        export_path = args.export or f'sensitive_data_report.{args.format}'
+        if not write_table([flat_record(a) for a in analyses], export_path, args.format):
+            sys.exit(1)
+        print(f"\n✅ Report exported to {export_path}")
+    else:
+        # Initialize tracker (used for the report)
+        tracker = SensitiveDataTracker(CONFIG)
         
-        # Analyze function
-        analysis = tracker.analyze_function(
-            method_name,
-            code,
-            filename,
-            graph_context
-        )
-        
-        # Filter by track type if specified
-        if args.track:
-            # Check if this analysis has the requested data type
-            has_type = any(
-                flow.get('type') == args.track 
-                for flow in analysis.get('data_flows', [])
-            )
-            if not has_type:
-                continue
+        # Generate report
+        report = tracker.generate_report(analyses, format=args.format)
         
-        # Only include if there's sensitive data or violations
-        if analysis.get('has_sensitive_data') or analysis.get('violations'):
-            analyses.append(analysis)
-    
-    # Generate report
-    report = tracker.generate_report(analyses, format=args.format)
-    
-    if args.export:
-        with open(args.export, 'w') as f:
-            f.write(report)
-        print(f"\n✅ Report exported to {args.export}")
-    elif args.format == 'console':
-        # Already printed by generate_report
-        pass
-    else:
-        print(report)
+        if args.export:
+            with open(args.export, 'w') as f:
+                f.write(report)
+            print(f"\n✅ Report exported to {args.export}")
+        elif args.format == 'console':
+            # Already printed by generate_report
+            pass
+        else:
+            print(report)
     
     # Print summary
     total_violations = sum(len(a.get('violations', [])) for a in analyses)